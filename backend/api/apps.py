@@ -9,3 +9,6 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'API Приложение'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,163 @@
+"""Ключи, версии и фрагменты кэша API."""
+
+import threading
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+from foodgram.constants import RECIPE_FRAGMENT_TTL, RECIPE_FRAGMENT_VERSION
+
+RECIPES = 'recipes'
+INGREDIENTS = 'ingredients'
+POPULARITY = 'popularity'
+SIMILARITY = 'similarity'
+PANTRY = 'pantry'
+TAGS = 'tags'
+
+
+class CommitBatch:
+    """
+    Значения, накопленные за транзакцию, обрабатываются одним вызовом.
+
+    Первое значение регистрирует handler через transaction.on_commit,
+    следующие добавляются в тот же пакет, пока обработчик остаётся в
+    очереди соединения. После отката Django снимает обработчик из
+    очереди, и следующее значение начинает новый пакет. Вне транзакции
+    handler вызывается сразу.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._local = threading.local()
+
+    def add(self, values):
+        """Добавление значений в пакет текущей транзакции."""
+
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None and any(
+            entry[1] is pending[1]
+            for entry in transaction.get_connection().run_on_commit
+        ):
+            pending[0].update(values)
+            return
+        batch = set(values)
+
+        def flush():
+            if self._local.pending[1] is flush:
+                self._local.pending = None
+            self.handler(batch)
+
+        self._local.pending = (batch, flush)
+        transaction.on_commit(flush)
+
+
+def favorites(user_id):
+    """Имя версии избранного пользователя."""
+
+    return f'favorites:{user_id}'
+
+
+def shopping_cart(user_id):
+    """Имя версии корзины покупок пользователя."""
+
+    return f'shopping_cart:{user_id}'
+
+
+def subscriptions(user_id):
+    """Имя версии подписок пользователя."""
+
+    return f'subscriptions:{user_id}'
+
+
+def generation_key(name):
+    """Ключ кэша, в котором хранится версия."""
+
+    return f'generation:{name}'
+
+
+def get_generations(*names):
+    """
+    Текущие версии данных для построения ключей кэша.
+
+    Версия - случайный токен, а не счётчик, поэтому после очистки кэша
+    старые ключи не могут совпасть с новыми.
+    """
+
+    keys = [generation_key(name) for name in names]
+    generations = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in generations}
+    if missing:
+        cache.set_many(missing, None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+stale_generations = CommitBatch(lambda keys: cache.delete_many(list(keys)))
+
+
+def bump_generations(*names):
+    """Сброс версий одним обращением к кэшу после фиксации транзакции."""
+
+    stale_generations.add(generation_key(name) for name in names)
+
+
+def rotate_generation(name):
+    """Немедленная смена версии; возвращает новую версию."""
+
+    generation = uuid4().hex
+    cache.set(generation_key(name), generation, None)
+    return generation
+
+
+def recipe_fragment_key(recipe):
+    """
+    Ключ кэша общей для всех пользователей части рецепта.
+
+    В ключ входит updated_at рецепта, поэтому фрагмент, собранный до
+    изменения рецепта и сохранённый после него, больше не читается.
+    """
+
+    return (
+        f'recipe:fragment:{RECIPE_FRAGMENT_VERSION}:{recipe.pk}:'
+        f'{recipe.updated_at.timestamp()}'
+    )
+
+
+def get_recipe_fragments(recipes):
+    """Закэшированные фрагменты рецептов по их id."""
+
+    keys = {recipe_fragment_key(recipe): recipe.pk for recipe in recipes}
+    return {
+        keys[key]: fragment
+        for key, fragment in cache.get_many(keys).items()
+    }
+
+
+def set_recipe_fragments(recipes, fragments):
+    """Сохранение фрагментов рецептов в кэш, fragments - по id рецепта."""
+
+    cache.set_many(
+        {
+            recipe_fragment_key(recipe): fragments[recipe.pk]
+            for recipe in recipes
+        },
+        RECIPE_FRAGMENT_TTL,
+    )
+
+
+def reset_recipe_fragments(recipe_ids):
+    """
+    Смена версии фрагментов рецептов обновлением их updated_at.
+
+    Выполняется в текущей транзакции; старые фрагменты истекают по TTL.
+    """
+
+    Recipe.objects.filter(id__in=recipe_ids).update(updated_at=timezone.now())
+
+
+# Сброс фрагментов рецептов, накопленных за транзакцию, одним запросом.
+stale_recipe_fragments = CommitBatch(reset_recipe_fragments)
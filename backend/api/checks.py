@@ -0,0 +1,30 @@
+"""Системные проверки настроек API."""
+
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Предупреждение о кэше в памяти процесса для check --deploy.
+
+    Версии кэша, ETag, кэшированные количества, фрагменты рецептов и
+    индексы в памяти сбрасываются через кэш. При локальном кэше сброс
+    виден только процессу, изменившему данные, а остальные воркеры
+    отдают устаревшие ответы.
+    """
+
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Warning(
+            'Кэш по умолчанию хранится в памяти процесса, сброс кэша API '
+            'не виден другим воркерам.',
+            hint='Задайте общий кэш через CACHE_BACKEND и CACHE_LOCATION, '
+            'например django.core.cache.backends.redis.RedisCache.',
+            id='api.W001',
+        )
+    ]
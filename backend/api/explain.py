@@ -0,0 +1,176 @@
+"""Проверка планов SQL-запросов основных эндпоинтов API."""
+
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import RecipeTag
+from users.models import Subscriber
+
+# Строки плана с полным сканированием таблицы: имя таблицы в группе 1.
+# В SQLite это и обход таблицы целиком по индексу (SCAN ... USING INDEX).
+FULL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT\b)(\w+)\b'),
+}
+# Индексы, по которым читаются таблицы: имя индекса в группе 1.
+INDEX_SCAN = {
+    'postgresql': re.compile(
+        r'(?:Index (?:Only )?Scan using|Bitmap Index Scan on) (\w+)'
+    ),
+    'sqlite': re.compile(r'\bUSING (?:COVERING )?INDEX (\w+)'),
+}
+# Подзапросы SQLite, которые сканируются в плане как таблицы.
+SUBQUERY = re.compile(r'\b(?:CO-ROUTINE|MATERIALIZE) (\w+)')
+# Теги рецептов страницы SQLite подгружает, читая небольшой справочник
+# тегов целиком и проверяя связи по индексу.
+TAGS_SCAN = ('recipes_tag',)
+
+
+def key_requests(user):
+    """
+    Основные запросы API от имени user.
+
+    Запрос - кортеж (название, URL, параметры, индексы, которые должны
+    быть в планах, таблицы, которые планы могут читать целиком). Автор,
+    рецепт и тег берутся из подписок и рецептов в БД.
+    """
+
+    subscription = Subscriber.objects.filter(user=user).order_by('id').first()
+    recipe_tag = RecipeTag.objects.order_by('recipe_id', 'tag_id').first()
+    return (
+        (
+            'favorites',
+            '/api/recipes/',
+            {'is_favorited': 1},
+            ('favorite_user_recipe_idx',),
+            TAGS_SCAN,
+        ),
+        (
+            'shopping_cart',
+            '/api/recipes/',
+            {'is_in_shopping_cart': 1},
+            ('cart_user_recipe_idx',),
+            TAGS_SCAN,
+        ),
+        (
+            'shopping_list',
+            '/api/recipes/download_shopping_cart/',
+            {},
+            ('cart_user_recipe_idx',),
+            (),
+        ),
+        (
+            'subscriptions',
+            '/api/users/subscriptions/',
+            {'recipes_limit': 3},
+            ('subscriber_user_author_idx', 'recipe_author_id_idx'),
+            (),
+        ),
+        (
+            'author_recipes',
+            '/api/recipes/',
+            {'author': subscription.author_id},
+            ('recipe_author_id_idx',),
+            (),
+        ),
+        (
+            'feed',
+            '/api/recipes/feed/',
+            {},
+            ('subscriber_user_author_idx',),
+            TAGS_SCAN,
+        ),
+        # Страница по тегу читает рецепты по порядку до LIMIT совпадений.
+        (
+            'tag_filter',
+            '/api/recipes/',
+            {'tags': recipe_tag.tag.slug},
+            (),
+            ('recipes_recipe', *TAGS_SCAN),
+        ),
+        ('recipe', f'/api/recipes/{recipe_tag.recipe_id}/', {}, (), ()),
+    )
+
+
+def explain(sql):
+    """План запроса в текстовом виде."""
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Seq Scan остаётся в плане, только если индекса нет совсем,
+            # а не потому что таблица мала.
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        finally:
+            if connection.vendor == 'postgresql':
+                cursor.execute('RESET enable_seqscan')
+
+
+def request_plans(client, url, params):
+    """Планы всех SELECT-запросов, выполненных при ответе на запрос."""
+
+    # Кэш сбрасывается, чтобы ответ собирался из БД.
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    if response.status_code != 200:
+        raise AssertionError(f'{url}: статус {response.status_code}.')
+    return [
+        explain(query['sql'])
+        for query in queries.captured_queries
+        if query['sql'].lstrip().upper().startswith('SELECT')
+    ]
+
+
+def vendor_pattern(patterns):
+    """Регулярное выражение для планов текущей БД."""
+
+    pattern = patterns.get(connection.vendor)
+    if pattern is None:
+        raise NotImplementedError(
+            f'Планы для {connection.vendor} не поддерживаются.'
+        )
+    return pattern
+
+
+def full_scans(plan, allowed=()):
+    """Полностью сканируемые таблицы плана, кроме allowed."""
+
+    return sorted(
+        set(vendor_pattern(FULL_SCAN).findall(plan))
+        - set(SUBQUERY.findall(plan))
+        - set(allowed)
+    )
+
+
+def plan_errors(plans, indexes, scans):
+    """
+    Нарушения в планах запроса.
+
+    Нарушения - полное сканирование таблиц не из scans и индексы
+    из indexes, которых нет ни в одном плане.
+    """
+
+    errors = [
+        f'полное сканирование {table}'
+        for plan in plans
+        for table in full_scans(plan, scans)
+    ]
+    used = {
+        index
+        for plan in plans
+        for index in vendor_pattern(INDEX_SCAN).findall(plan)
+    }
+    errors.extend(
+        f'не используется индекс {index}'
+        for index in indexes
+        if index not in used
+    )
+    return errors
@@ -1,9 +1,12 @@
 """Наборы фильтров для моделей API."""
 
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 from django_filters.rest_framework import FilterSet
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, RecipeTag
+
+from .indexes import tag_index
 
 
 class IngredientFilterSet(FilterSet):
@@ -18,18 +21,48 @@ class IngredientFilterSet(FilterSet):
         fields = ('name',)
 
 
+def tag_choices():
+    """Варианты выбора тега по slug, вычисляются при создании формы."""
+
+    return tag_index.choices()
+
+
+class TagFilter(filters.MultipleChoiceFilter):
+    """
+    Фильтр рецептов, у которых есть хотя бы один из тегов.
+
+    Slug проверяются и переводятся в id по индексу тегов в памяти,
+    отбор - подзапрос EXISTS по RecipeTag без соединения и DISTINCT.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', tag_choices)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(
+            Exists(
+                RecipeTag.objects.filter(
+                    recipe=OuterRef('pk'), tag_id__in=tag_index.ids(value)
+                )
+            )
+        )
+
+
 class RecipeFilterSet(FilterSet):
     """Фильтр для рецептов."""
 
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
-    )
+    tags = TagFilter()
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'),),
+        method='filter_ordering',
+    )
 
     def filter_is_favorited(self, queryset, name, value):
         """Фильтр по избранным рецептам."""
@@ -55,8 +88,21 @@ class RecipeFilterSet(FilterSet):
             return queryset.filter(shoppingcarts__user_id=user.id)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по убыванию популярности."""
+
+        if value == 'popular':
+            return queryset.order_by('-popularity', '-id')
+        return queryset
+
     class Meta:
         """Мета."""
 
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags',
+            'author',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'ordering',
+        )
@@ -0,0 +1,623 @@
+"""Индексы в памяти процесса для ответов API без обращения к БД."""
+
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from heapq import nlargest, nsmallest
+from itertools import islice
+from time import monotonic
+
+from django.core.cache import cache
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+from foodgram.constants import (INDEX_DELTA_MAX, INDEX_DELTA_TTL, INDEX_TTL,
+                                SIMILAR_CANDIDATES_MAX, STREAM_CHUNK_SIZE)
+
+from . import cache as api_cache
+
+WORD_START = re.compile(r'(?<=[\s\-,(])\w')
+
+
+def sorted_index(values, value):
+    """Позиция value в отсортированной последовательности или None."""
+
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        return position
+    return None
+
+
+def normalize(text):
+    """Нормализация строки для поиска: регистр и буква 'ё'."""
+
+    return text.casefold().replace('ё', 'е')
+
+
+class ProcessIndex:
+    """
+    Индекс, перестраиваемый при смене версии данных в кэше.
+
+    Версия хранится в кэше, поэтому при общем бэкенде кэша изменение
+    в одном процессе перестраивает индексы во всех. TTL ограничивает
+    устаревание, если версия в кэше была потеряна.
+    """
+
+    generation_name = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._built_at = None
+
+    def is_fresh(self, generation):
+        """Соответствует ли индекс переданной версии данных."""
+
+        return (
+            generation == self._generation
+            and monotonic() - self._built_at < INDEX_TTL
+        )
+
+    def refresh(self):
+        """Перестроение индекса, если данные изменились."""
+
+        generation, = api_cache.get_generations(self.generation_name)
+        if not self.is_fresh(generation):
+            with self._lock:
+                if not self.is_fresh(generation):
+                    self.build()
+                    self._generation = generation
+                    self._built_at = monotonic()
+        return generation
+
+    def build(self):
+        """Построение индекса из БД."""
+
+        raise NotImplementedError
+
+
+class RecipeIndex(ProcessIndex):
+    """
+    Индекс рецептов, обновляемый по журналу изменений в кэше.
+
+    Процесс, зафиксировавший изменение рецептов, публикует их id в журнал
+    под следующим номером версии (cache.incr), и остальные процессы
+    перечитывают из БД только эти рецепты. Полный индекс берётся из
+    снимка, который команда build_indexes кладёт в кэш вместе с номером
+    версии журнала, и только без снимка строится из БД. Снимок и журнал
+    привязаны к версии данных generation_name: при её смене, потере
+    номера версии или разрыве в журнале дольше INDEX_TTL индекс
+    загружается заново.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._version = None
+
+    def version_key(self, generation):
+        """Ключ номера последней записи журнала."""
+
+        return f'index:{self.generation_name}:{generation}:version'
+
+    def delta_key(self, generation, version):
+        """Ключ записи журнала: id изменённых рецептов."""
+
+        return f'index:{self.generation_name}:{generation}:{version}'
+
+    def snapshot_key(self):
+        """Ключ снимка индекса."""
+
+        return f'index:{self.generation_name}:snapshot'
+
+    def state(self):
+        """
+        Текущие версия данных и номер записи журнала.
+
+        Если номера нет (первый запуск или вытеснение из кэша), версия
+        данных меняется: записи журнала под старым номером могли
+        остаться в кэше и не должны смешиваться с новыми.
+        """
+
+        generation, = api_cache.get_generations(self.generation_name)
+        version = cache.get(self.version_key(generation))
+        if version is None:
+            generation = api_cache.rotate_generation(self.generation_name)
+            cache.add(self.version_key(generation), 0, None)
+            version = cache.get(self.version_key(generation), 0)
+        return generation, version
+
+    def is_current(self, generation, version):
+        """Соответствует ли индекс версии данных и номеру журнала."""
+
+        return self.is_fresh(generation) and version == self._version
+
+    def refresh(self):
+        """Догоняющее применение журнала или загрузка индекса."""
+
+        generation, version = self.state()
+        if not self.is_current(generation, version):
+            with self._lock:
+                if not self.is_current(generation, version):
+                    self.sync(generation, version)
+        return generation
+
+    def sync(self, generation, version):
+        """
+        Приведение индекса к версии данных и номеру журнала.
+
+        Индекс, отстающий не больше чем на INDEX_DELTA_MAX записей,
+        догоняет журнал. Иначе загружается снимок, если журнал после него
+        не длиннее INDEX_DELTA_MAX, а без такого снимка индекс строится
+        из БД.
+        """
+
+        if (
+            self.is_fresh(generation)
+            and self._version is not None
+            and 0 <= version - self._version <= INDEX_DELTA_MAX
+        ):
+            self.catch_up(generation, version)
+            return
+        snapshot = cache.get(self.snapshot_key())
+        if (
+            snapshot is not None
+            and snapshot[0] == generation
+            and 0 <= version - snapshot[1] <= INDEX_DELTA_MAX
+        ):
+            _, self._version, data = snapshot
+            self.load(data)
+        else:
+            self._version = version
+            self.load(self.read())
+        self._generation = generation
+        self._built_at = monotonic()
+        self.catch_up(generation, version)
+
+    def catch_up(self, generation, version):
+        """
+        Применение записей журнала после текущего номера.
+
+        Записи применяются до первой отсутствующей: она могла быть ещё
+        не записана опубликовавшим процессом и будет прочитана позже.
+        """
+
+        versions = range(self._version + 1, version + 1)
+        deltas = cache.get_many(
+            [self.delta_key(generation, number) for number in versions]
+        )
+        recipe_ids = set()
+        for number in versions:
+            delta = deltas.get(self.delta_key(generation, number))
+            if delta is None:
+                break
+            recipe_ids.update(delta)
+            self._version = number
+        if recipe_ids:
+            self.update(recipe_ids)
+
+    def publish(self, recipe_ids):
+        """
+        Публикация изменённых рецептов в журнал.
+
+        Вызывается после фиксации транзакции. Индекс текущего процесса,
+        если он не отстаёт от журнала, обновляется сразу.
+        """
+
+        generation, _ = self.state()
+        try:
+            version = cache.incr(self.version_key(generation))
+        except ValueError:
+            api_cache.rotate_generation(self.generation_name)
+            return
+        cache.set(
+            self.delta_key(generation, version),
+            list(recipe_ids),
+            INDEX_DELTA_TTL,
+        )
+        with self._lock:
+            if self.is_fresh(generation) and self._version == version - 1:
+                self.update(recipe_ids)
+                self._version = version
+
+    def publish_snapshot(self):
+        """
+        Построение индекса из БД и сохранение снимка в кэш.
+
+        Номер журнала читается до чтения БД, поэтому изменения, которые
+        снимок мог не увидеть, есть в журнале после этого номера.
+        Возвращает номер журнала снимка.
+        """
+
+        generation, version = self.state()
+        cache.set(
+            self.snapshot_key(), (generation, version, self.read()), None
+        )
+        return version
+
+    def build(self):
+        self.load(self.read())
+
+    def read(self, recipe_ids=None):
+        """Данные индекса из БД для всех рецептов или recipe_ids."""
+
+        raise NotImplementedError
+
+    def load(self, data):
+        """Замена всего индекса данными read()."""
+
+        raise NotImplementedError
+
+    def update(self, recipe_ids):
+        """Перечитывание рецептов recipe_ids из БД."""
+
+        raise NotImplementedError
+
+
+class IngredientIndex(ProcessIndex):
+    """
+    Отсортированный индекс названий ингредиентов для автодополнения.
+
+    Поиск - два bisect по нормализованным названиям и по началам слов
+    внутри названий.
+    """
+
+    generation_name = api_cache.INGREDIENTS
+
+    def __init__(self):
+        super().__init__()
+        self._names = ([], [])
+        self._words = ([], [])
+
+    def build(self):
+        names = []
+        words = []
+        ingredients = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        )
+        for pk, name, measurement_unit in ingredients.iterator():
+            item = {
+                'id': pk,
+                'name': name,
+                'measurement_unit': measurement_unit,
+            }
+            key = normalize(name)
+            names.append((key, pk, item))
+            words.extend(
+                (key[match.start():], pk, item)
+                for match in WORD_START.finditer(key)
+            )
+        names.sort(key=lambda entry: entry[:2])
+        words.sort(key=lambda entry: entry[:2])
+        self._names = (
+            [key for key, _, _ in names], [item for _, _, item in names]
+        )
+        self._words = (
+            [key for key, _, _ in words], [item for _, _, item in words]
+        )
+
+    @staticmethod
+    def prefix_range(index, prefix):
+        """Ключи и объекты индекса, начинающиеся с prefix."""
+
+        keys, items = index
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(sys.maxunicode), start)
+        return zip(keys[start:end], items[start:end])
+
+    def search(self, query, limit):
+        """
+        Поиск ингредиентов по началу названия.
+
+        Сначала идут точные совпадения, затем совпадения по началу
+        названия, затем по началу слова внутри названия.
+        """
+
+        self.refresh()
+        prefix = normalize(query.strip())
+        exact = []
+        starts = []
+        for key, item in self.prefix_range(self._names, prefix):
+            (exact if key == prefix else starts).append(item)
+        starts.sort(key=lambda item: len(item['name']))
+        results = exact + starts
+        if len(results) < limit:
+            found = {item['id'] for item in results}
+            inner = {}
+            for _, item in self.prefix_range(self._words, prefix):
+                if item['id'] not in found:
+                    inner.setdefault(item['id'], item)
+            results.extend(
+                sorted(inner.values(), key=lambda item: len(item['name']))
+            )
+        return results[:limit]
+
+
+class RecipeSimilarityIndex(RecipeIndex):
+    """
+    Разреженная матрица рецептов по ингредиентам и тегам.
+
+    Для рецепта хранится множество его признаков (строка матрицы), для
+    ингредиента - множество рецептов с ним (столбец). Кандидаты берутся
+    из столбцов ингредиентов рецепта, начиная с самых редких, и их число
+    ограничено SIMILAR_CANDIDATES_MAX: теги и частые ингредиенты есть
+    у большой доли рецептов, и проход по ним был бы линейным по всем
+    рецептам. Сходство кандидатов считается по всем признакам. Множества
+    не изменяются на месте, а заменяются, поэтому чтение безопасно
+    во время обновления.
+    """
+
+    generation_name = api_cache.SIMILARITY
+
+    def __init__(self):
+        super().__init__()
+        self._features = {}
+        self._postings = {}
+
+    def read(self, recipe_ids=None):
+        """Признаки рецептов из БД: {id рецепта: множество признаков}."""
+
+        recipes = Recipe.objects.all()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+        features = {
+            recipe_id: set()
+            for recipe_id in recipes.values_list('id', flat=True).iterator()
+        }
+        relations = (
+            (RecipeIngredient, 'ingredient', 'ingredient_id'),
+            (RecipeTag, 'tag', 'tag_id'),
+        )
+        for model, kind, field in relations:
+            rows = model.objects.all()
+            if recipe_ids is not None:
+                rows = rows.filter(recipe_id__in=recipe_ids)
+            for recipe_id, feature_id in rows.values_list(
+                'recipe_id', field
+            ).iterator(chunk_size=STREAM_CHUNK_SIZE):
+                if recipe_id in features:
+                    features[recipe_id].add((kind, feature_id))
+        return {
+            recipe_id: frozenset(recipe_features)
+            for recipe_id, recipe_features in features.items()
+        }
+
+    @staticmethod
+    def candidate_features(features):
+        """Признаки, по которым ищутся кандидаты: ингредиенты."""
+
+        return [feature for feature in features if feature[0] == 'ingredient']
+
+    def load(self, features):
+        postings = defaultdict(set)
+        for recipe_id, recipe_features in features.items():
+            for feature in self.candidate_features(recipe_features):
+                postings[feature].add(recipe_id)
+        self._features = features
+        self._postings = {
+            feature: frozenset(recipe_ids)
+            for feature, recipe_ids in postings.items()
+        }
+
+    def update(self, recipe_ids):
+        features = self.read(recipe_ids)
+        for recipe_id in recipe_ids:
+            old = self._features.get(recipe_id, frozenset())
+            new = features.get(recipe_id, frozenset())
+            for feature in self.candidate_features(old - new):
+                self._postings[feature] = self._postings[feature] - {
+                    recipe_id
+                }
+            for feature in self.candidate_features(new - old):
+                self._postings[feature] = self._postings.get(
+                    feature, frozenset()
+                ) | {recipe_id}
+            if recipe_id in features:
+                self._features[recipe_id] = new
+            else:
+                self._features.pop(recipe_id, None)
+
+    def similar(self, recipe_id, limit):
+        """
+        Id рецептов, наиболее похожих на recipe_id по коэффициенту Жаккара.
+
+        Возвращает None, если рецепта нет в индексе.
+        """
+
+        self.refresh()
+        all_features = self._features
+        features = all_features.get(recipe_id)
+        if features is None:
+            return None
+        postings = sorted(
+            (
+                self._postings.get(feature, frozenset())
+                for feature in self.candidate_features(features)
+            ),
+            key=len,
+        )
+        candidates = set()
+        for posting in postings:
+            free = SIMILAR_CANDIDATES_MAX - len(candidates)
+            if free <= 0:
+                break
+            candidates.update(
+                posting if len(posting) <= free else islice(posting, free)
+            )
+        candidates.discard(recipe_id)
+        scores = []
+        for other_id in candidates:
+            other_features = all_features.get(other_id)
+            if other_features is not None:
+                common = len(features & other_features)
+                union = len(features) + len(other_features) - common
+                scores.append((common / union, other_id))
+        return [other_id for _, other_id in nlargest(limit, scores)]
+
+
+class PantryIndex(RecipeIndex):
+    """
+    Инвертированный индекс ингредиентов для поиска по имеющимся продуктам.
+
+    Для ингредиента хранится отсортированный массив id рецептов с ним,
+    для рецептов - отсортированный массив id и параллельный массив числа
+    их ингредиентов. Поиск проходит только по массивам запрошенных
+    ингредиентов: число совпадений рецепта - сколько раз он в них
+    встретился, недостающие - остальные его ингредиенты. Массивы
+    не изменяются на месте, а заменяются, поэтому чтение безопасно
+    во время обновления.
+    """
+
+    generation_name = api_cache.PANTRY
+
+    def __init__(self):
+        super().__init__()
+        self._recipes = (array('q'), array('I'))
+        self._postings = {}
+
+    def read(self, recipe_ids=None):
+        """Ингредиенты рецептов из БД: {id рецепта: список id}."""
+
+        recipes = Recipe.objects.all()
+        rows = RecipeIngredient.objects.all()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        ingredients = {
+            recipe_id: []
+            for recipe_id in recipes.values_list('id', flat=True).iterator()
+        }
+        for recipe_id, ingredient_id in rows.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator(chunk_size=STREAM_CHUNK_SIZE):
+            if recipe_id in ingredients:
+                ingredients[recipe_id].append(ingredient_id)
+        return ingredients
+
+    def load(self, ingredients):
+        recipe_ids = sorted(ingredients)
+        postings = defaultdict(list)
+        for recipe_id in recipe_ids:
+            for ingredient_id in set(ingredients[recipe_id]):
+                postings[ingredient_id].append(recipe_id)
+        self._recipes = (
+            array('q', recipe_ids),
+            array(
+                'I',
+                (len(set(ingredients[recipe_id])) for recipe_id in recipe_ids),
+            ),
+        )
+        self._postings = {
+            ingredient_id: array('q', posting)
+            for ingredient_id, posting in postings.items()
+        }
+
+    def update(self, recipe_ids):
+        ingredients = self.read(recipe_ids)
+        recipe_ids = sorted(set(recipe_ids))
+        ids, counts = (
+            array(values.typecode, values) for values in self._recipes
+        )
+        added = defaultdict(list)
+        for recipe_id in recipe_ids:
+            position = sorted_index(ids, recipe_id)
+            if recipe_id in ingredients:
+                recipe_ingredients = set(ingredients[recipe_id])
+                for ingredient_id in recipe_ingredients:
+                    added[ingredient_id].append(recipe_id)
+                if position is None:
+                    position = bisect_left(ids, recipe_id)
+                    ids.insert(position, recipe_id)
+                    counts.insert(position, len(recipe_ingredients))
+                else:
+                    counts[position] = len(recipe_ingredients)
+            elif position is not None:
+                del ids[position]
+                del counts[position]
+        postings = dict(self._postings)
+        changed = set(recipe_ids)
+        for ingredient_id in set(postings) | set(added):
+            posting = postings.get(ingredient_id, ())
+            if ingredient_id not in added and not any(
+                sorted_index(posting, recipe_id) is not None
+                for recipe_id in recipe_ids
+            ):
+                continue
+            posting = sorted(
+                [
+                    recipe_id
+                    for recipe_id in posting
+                    if recipe_id not in changed
+                ]
+                + added.get(ingredient_id, [])
+            )
+            if posting:
+                postings[ingredient_id] = array('q', posting)
+            else:
+                del postings[ingredient_id]
+        self._recipes = (ids, counts)
+        self._postings = postings
+
+    def search(self, ingredient_ids, max_missing, limit):
+        """
+        Рецепты, для которых не хватает не больше max_missing ингредиентов.
+
+        Возвращает кортежи (id рецепта, есть, не хватает). Сначала идут
+        рецепты с меньшим числом недостающих ингредиентов, затем с большей
+        долей имеющихся.
+        """
+
+        self.refresh()
+        postings = self._postings
+        matches = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matches.update(postings.get(ingredient_id, ()))
+        recipe_ids, counts = self._recipes
+        results = []
+        for recipe_id, matched in matches.items():
+            position = sorted_index(recipe_ids, recipe_id)
+            if position is None:
+                continue
+            missing = counts[position] - matched
+            if 0 <= missing <= max_missing:
+                results.append((recipe_id, matched, missing))
+        return nsmallest(
+            limit,
+            results,
+            key=lambda item: (
+                item[2], -item[1] / (item[1] + item[2]), -item[0]
+            ),
+        )
+
+
+class TagIndex(ProcessIndex):
+    """Соответствие slug тегов их id для фильтрации без запроса к Tag."""
+
+    generation_name = api_cache.TAGS
+
+    def __init__(self):
+        super().__init__()
+        self._ids = {}
+
+    def build(self):
+        self._ids = dict(Tag.objects.values_list('slug', 'id'))
+
+    def choices(self):
+        """Варианты выбора тега по slug."""
+
+        self.refresh()
+        return [(slug, slug) for slug in self._ids]
+
+    def ids(self, slugs):
+        """Id тегов с переданными slug; неизвестные пропускаются."""
+
+        self.refresh()
+        return [self._ids[slug] for slug in slugs if slug in self._ids]
+
+
+ingredient_index = IngredientIndex()
+pantry_index = PantryIndex()
+similarity_index = RecipeSimilarityIndex()
+tag_index = TagIndex()
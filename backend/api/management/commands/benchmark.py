@@ -0,0 +1,206 @@
+"""Замеры производительности основных эндпоинтов API."""
+
+import json
+import statistics
+import tracemalloc
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import ShoppingCart
+from users.models import Subscriber, User
+
+from ..dataset import seeded_database
+
+BASELINE_PATH = settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+# Время меньше этой разницы с эталоном не считается регрессией, мс.
+TIME_SLACK_MS = 5
+# (название, URL, параметры, пользователь: None, 'subscriber' или 'buyer')
+SCENARIOS = (
+    ('recipes_anonymous', '/api/recipes/', {'limit': 6}, None),
+    ('recipes_user', '/api/recipes/', {'limit': 6}, 'subscriber'),
+    (
+        'recipes_popular',
+        '/api/recipes/',
+        {'ordering': 'popular', 'limit': 6},
+        None,
+    ),
+    (
+        'subscriptions',
+        '/api/users/subscriptions/',
+        {'recipes_limit': 3, 'limit': 6},
+        'subscriber',
+    ),
+    (
+        'ingredients_search',
+        '/api/ingredients/',
+        {'name': 'ингредиент 1'},
+        None,
+    ),
+    (
+        'download_shopping_cart',
+        '/api/recipes/download_shopping_cart/',
+        {},
+        'buyer',
+    ),
+)
+
+
+class Command(BaseCommand):
+    """Прогон эндпоинтов на фиксированном наборе данных."""
+
+    help = (
+        'Создаёт тестовую БД с фиксированным набором данных, замеряет время, '
+        'число SQL-запросов и пик памяти запросов к основным эндпоинтам и '
+        'сравнивает их с эталоном. Время зависит от машины, поэтому эталон '
+        'стоит записывать там же, где выполняется сравнение.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов запроса с прогретым кэшем.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.5,
+            help='Допустимый относительный рост времени и памяти.',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(BASELINE_PATH),
+            help='Путь к файлу эталона.',
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Записать результаты как новый эталон.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42, help='Зерно генератора данных.'
+        )
+
+    def handle(self, *args, **options):
+        with seeded_database(options['seed']):
+            results = self.run(options['repeat'])
+        self.report(results)
+        if options['update_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(f'Эталон записан в {options["baseline"]}.')
+            return
+        try:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(
+                f'Нет эталона {options["baseline"]}, '
+                'запустите с --update-baseline.'
+            )
+        regressions = self.compare(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def request(self, client, url, params):
+        """Время запроса в мс и число SQL-запросов."""
+
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{url}: статус {response.status_code}.')
+        return elapsed, len(queries)
+
+    def run(self, repeat):
+        """Замеры сценариев: холодный запрос, повторы и пик памяти."""
+
+        users = {
+            'subscriber': Subscriber.objects.values('user')
+            .annotate(count=Count('id'))
+            .order_by('-count', 'user')
+            .first()['user'],
+            'buyer': ShoppingCart.objects.values('user')
+            .annotate(count=Count('id'))
+            .order_by('-count', 'user')
+            .first()['user'],
+        }
+        results = {}
+        for name, url, params, user in SCENARIOS:
+            client = APIClient()
+            if user is not None:
+                client.force_authenticate(
+                    User.objects.get(pk=users[user])
+                )
+            cache.clear()
+            time_cold, queries_cold = self.request(client, url, params)
+            times = [
+                self.request(client, url, params)[0] for _ in range(repeat)
+            ]
+            tracemalloc.start()
+            try:
+                _, queries_warm = self.request(client, url, params)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            results[name] = {
+                'queries_cold': queries_cold,
+                'queries_warm': queries_warm,
+                'time_cold_ms': round(time_cold, 2),
+                'time_ms': round(statistics.median(times), 2),
+                'peak_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"сценарий":<24}{"запросы":>10}{"холодный, мс":>14}'
+            f'{"мс":>10}{"память, КБ":>12}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24}'
+                f'{result["queries_cold"]:>5}/{result["queries_warm"]:<4}'
+                f'{result["time_cold_ms"]:>14}{result["time_ms"]:>10}'
+                f'{result["peak_kb"]:>12}'
+            )
+
+    def compare(self, results, baseline, threshold):
+        """Описания регрессий относительно эталона."""
+
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            for key in ('queries_cold', 'queries_warm'):
+                if result[key] > expected[key]:
+                    regressions.append(
+                        f'{name}: {key} {expected[key]} -> {result[key]}'
+                    )
+            for key, slack in (
+                ('time_cold_ms', TIME_SLACK_MS),
+                ('time_ms', TIME_SLACK_MS),
+                ('peak_kb', 0),
+            ):
+                limit = expected[key] * (1 + threshold) + slack
+                if result[key] > limit:
+                    regressions.append(
+                        f'{name}: {key} {expected[key]} -> {result[key]}'
+                    )
+        return regressions
@@ -0,0 +1,25 @@
+"""Построение индексов рецептов и сохранение их снимков в кэш."""
+
+from django.core.management.base import BaseCommand
+
+from api.indexes import pantry_index, similarity_index
+
+
+class Command(BaseCommand):
+    """Снимки индексов похожих рецептов и поиска по продуктам."""
+
+    help = (
+        'Строит индексы похожих рецептов и поиска по продуктам из БД и '
+        'сохраняет снимки в кэш. Процессы загружают снимок и применяют '
+        'журнал изменений после него вместо построения индекса из БД. '
+        'Запускать после массовой загрузки данных и периодически.'
+    )
+
+    def handle(self, *args, **options):
+        for name, index in (
+            ('похожие рецепты', similarity_index),
+            ('поиск по продуктам', pantry_index),
+        ):
+            version = index.publish_snapshot()
+            self.stdout.write(f'{name}: снимок на записи журнала {version}')
+        self.stdout.write(self.style.SUCCESS('Индексы построены.'))
@@ -0,0 +1,61 @@
+"""Проверка планов основных запросов: полные сканирования и индексы."""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from users.models import Subscriber
+
+from ...explain import FULL_SCAN, key_requests, plan_errors, request_plans
+from ..dataset import seeded_database
+
+
+class Command(BaseCommand):
+    """EXPLAIN SQL основных эндпоинтов на тестовой БД с данными."""
+
+    help = (
+        'Создаёт тестовую БД с фиксированным набором данных, выполняет '
+        'основные запросы API и проверяет, что в планах их SQL нет '
+        'неожиданного полного сканирования таблиц и используются '
+        'ожидаемые индексы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=42, help='Зерно генератора данных.'
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Выводить планы всех запросов.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN:
+            raise CommandError(
+                f'Планы для {connection.vendor} не поддерживаются.'
+            )
+        failures = []
+        with seeded_database(options['seed']):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            user = Subscriber.objects.order_by('id').first().user
+            client = APIClient()
+            client.force_authenticate(user)
+            requests = key_requests(user)
+            for name, url, params, indexes, scans in requests:
+                plans = request_plans(client, url, params)
+                errors = plan_errors(plans, indexes, scans)
+                if options['verbose_plans'] or errors:
+                    self.stdout.write(f'{name}:\n' + '\n'.join(plans) + '\n')
+                failures.extend(f'{name}: {error}' for error in errors)
+        if failures:
+            raise CommandError(
+                'Нарушения в планах запросов:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Проверено запросов: {len(requests)}, '
+                'планы используют ожидаемые индексы.'
+            )
+        )
@@ -0,0 +1,59 @@
+"""Временная БД с фиксированным набором данных для замеров."""
+
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from recipes.models import Ingredient
+
+DATASET = {
+    'users': 500,
+    'recipes': 5000,
+    'subscriptions': 5000,
+    'favorites': 10000,
+    'carts': 5000,
+    'short_links': 0,
+}
+INGREDIENTS_COUNT = 2000
+ISOLATED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dataset',
+    }
+}
+
+
+@contextmanager
+def seeded_database(seed):
+    """
+    Тестовая БД с данными generate_fake_data и отдельным кэшем.
+
+    Рабочие БД и кэш не затрагиваются; тестовая БД удаляется на выходе.
+    """
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(CACHES=ISOLATED_CACHES):
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+                for number in range(INGREDIENTS_COUNT)
+            )
+            call_command(
+                'generate_fake_data',
+                *(
+                    f'--{name.replace("_", "-")}={value}'
+                    for name, value in DATASET.items()
+                ),
+                f'--seed={seed}',
+                stdout=StringIO(),
+            )
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,85 @@
+"""Миксины для вьюсетов API."""
+
+from hashlib import md5
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list и retrieve.
+
+    Если ETag или Last-Modified совпадают с заголовками запроса,
+    возвращается 304 без запуска сериализатора.
+    """
+
+    # Дата изменения отданного объекта, если get_validators её не вычислил.
+    response_last_modified = None
+
+    def get_validators(self, request):
+        """Пара (ETag, дата изменения) для текущего запроса."""
+
+        return None, None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Ответ 304 или результат handler с заголовками валидаторов."""
+
+        etag, last_modified = self.get_validators(request)
+        if etag is not None:
+            etag = quote_etag(md5(etag.encode()).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=self.timestamp(last_modified)
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            last_modified = last_modified or self.response_last_modified
+        timestamp = self.timestamp(last_modified)
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    @staticmethod
+    def timestamp(last_modified):
+        """Дата изменения в секундах для заголовков HTTP."""
+
+        return int(last_modified.timestamp()) if last_modified else None
+
+
+class UpdatedAtConditionalMixin(ConditionalGetMixin):
+    """Валидаторы по количеству объектов и полю updated_at."""
+
+    def get_validators(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                queryset = queryset.filter(
+                    **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+                )
+            except (TypeError, ValueError):
+                return None, None
+        stats = queryset.aggregate(
+            count=Count('pk'), last_modified=Max('updated_at')
+        )
+        if not stats['count']:
+            return None, None
+        etag = (
+            f'{request.get_full_path()}:{stats["count"]}:'
+            f'{stats["last_modified"].isoformat()}'
+        )
+        return etag, stats['last_modified']
@@ -1,8 +1,67 @@
 """Кастомная пагинация для API."""
 
-from rest_framework.pagination import PageNumberPagination
+from functools import partial
+from hashlib import md5
 
-from foodgram.constants import PAGES_LIMIT_DEFAULT
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.constants import (APPROXIMATE_COUNT_THRESHOLD,
+                                PAGES_LIMIT_DEFAULT, PAGINATION_COUNT_TTL)
+
+from . import cache as api_cache
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор с кэшированным количеством объектов.
+
+    При approximate=True на PostgreSQL количество берётся из оценки
+    планировщика, если таблица достаточно большая.
+    """
+
+    def __init__(self, *args, cache_key=None, approximate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.approximate = approximate
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = self.approximate_count() if self.approximate else None
+            if count is None:
+                count = super().count
+            cache.set(self.cache_key, count, PAGINATION_COUNT_TTL)
+        return count
+
+    def approximate_count(self):
+        """Оценка числа строк таблицы по статистике PostgreSQL."""
+
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < APPROXIMATE_COUNT_THRESHOLD:
+            return None
+        return row[0]
 
 
 class Pagination(PageNumberPagination):
@@ -10,3 +69,181 @@ class Pagination(PageNumberPagination):
 
     page_size_query_param = 'limit'
     page_size = PAGES_LIMIT_DEFAULT
+    max_page_size = settings.PAGES_LIMIT_MAX
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация по первичному ключу рецепта."""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = PAGES_LIMIT_DEFAULT
+    max_page_size = settings.PAGES_LIMIT_MAX
+    ordering = 'id'
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
+class FeedPagination(BasePagination):
+    """
+    Keyset-пагинация ленты по id рецепта от новых к старым.
+
+    Курсор - id последнего рецепта страницы, следующая страница
+    начинается с меньших id, поэтому OFFSET и COUNT(*) не нужны.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = PAGES_LIMIT_DEFAULT
+    max_page_size = settings.PAGES_LIMIT_MAX
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_ids(self, request, fetch):
+        """Id объектов страницы, fetch(limit, before) - источник id."""
+
+        self.request = request
+        limit = self.get_page_size(request)
+        ids = fetch(limit + 1, self.decode_cursor(request))
+        self.next_cursor = ids[limit - 1] if len(ids) > limit else None
+        return ids[:limit]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor,
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class PopularCursorPagination(FeedPagination):
+    """
+    Keyset-пагинация рецептов по убыванию популярности.
+
+    Курсор - пара (популярность, id) последнего рецепта страницы, поэтому
+    рецепты с одинаковой популярностью тоже листаются без OFFSET.
+    """
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            popularity, pk = cursor.split('_')
+            return float(popularity), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            popularity, pk = cursor
+            queryset = queryset.filter(popularity__lte=popularity).filter(
+                Q(popularity__lt=popularity) | Q(id__lt=pk)
+            )
+        recipes = list(queryset.order_by('-popularity', '-id')[:limit + 1])
+        self.next_cursor = None
+        if len(recipes) > limit:
+            last = recipes[limit - 1]
+            self.next_cursor = f'{last.popularity!r}_{last.pk}'
+        return recipes[:limit]
+
+    def get_paginated_response(self, data):
+        return Response(
+            {'next': self.get_next_link(), 'previous': None, 'results': data}
+        )
+
+
+class RecipePagination(Pagination):
+    """
+    Постраничная пагинация рецептов с курсорным режимом.
+
+    Курсорный режим включается параметром 'cursor' (в том числе пустым)
+    и не выполняет COUNT(*) и OFFSET. В постраничном режиме COUNT(*)
+    кэшируется по нормализованному набору фильтров.
+    """
+
+    cursor_pagination_class = RecipeCursorPagination
+    popular_cursor_pagination_class = PopularCursorPagination
+    user_filters = {
+        'is_favorited': api_cache.favorites,
+        'is_in_shopping_cart': api_cache.shopping_cart,
+    }
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def get_count_cache_key(self, request, view):
+        """Ключ кэша COUNT(*) для фильтров запроса."""
+
+        filters = []
+        generations = [api_cache.RECIPES]
+        for name in sorted(view.filterset_class.base_filters):
+            values = sorted(request.query_params.getlist(name))
+            if not values:
+                continue
+            filters.append(f'{name}={",".join(values)}')
+            if name in self.user_filters and request.user.is_authenticated:
+                generations.append(self.user_filters[name](request.user.id))
+        signature = '&'.join(filters)
+        if len(generations) > 1:
+            signature += f'&user={request.user.id}'
+        versions = ':'.join(api_cache.get_generations(*generations))
+        digest = md5(signature.encode()).hexdigest()
+        return f'recipes:count:{versions}:{digest}', not filters
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param in request.query_params:
+            self.cursor_paginator = (
+                self.popular_cursor_pagination_class()
+                if request.query_params.get('ordering') == 'popular'
+                else self.cursor_pagination_class()
+            )
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        cache_key, unfiltered = self.get_count_cache_key(request, view)
+        approximate = (
+            settings.PAGINATION_APPROXIMATE_COUNT
+            and unfiltered
+            and not request.user.is_authenticated
+        )
+        if approximate:
+            cache_key += ':approximate'
+        self.django_paginator_class = partial(
+            CachedCountPaginator, cache_key=cache_key, approximate=approximate
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
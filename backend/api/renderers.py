@@ -0,0 +1,99 @@
+"""Рендереры списка покупок."""
+
+import csv
+from html import escape
+
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Выбор формата списка покупок; по умолчанию - первый рендерер."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            if self.settings.URL_FORMAT_OVERRIDE in request.query_params:
+                raise
+            return renderers[0], renderers[0].media_type
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Список отдаётся потоком через stream(), а render() нужен только для
+    ответов с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data)
+
+    def stream(self, ingredients):
+        """Строки файла по кортежам (название, единица, количество)."""
+
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок в текстовом формате."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        separator = ''
+        for name, measurement_unit, amount in ingredients:
+            yield f'{separator}{name} - {amount} ({measurement_unit})'
+            separator = '\n'
+
+
+class Echo:
+    """Псевдо-файл, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield '\ufeff' + writer.writerow(
+            ('Ингредиент', 'Количество', 'Единица измерения')
+        )
+        for name, measurement_unit, amount in ingredients:
+            yield writer.writerow((name, amount, measurement_unit))
+
+
+class ShoppingListHTMLRenderer(ShoppingListRenderer):
+    """Список покупок в виде страницы для печати."""
+
+    media_type = 'text/html'
+    format = 'html'
+
+    def stream(self, ingredients):
+        yield (
+            '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+            '<title>Список покупок</title><style>'
+            'body{font-family:sans-serif}'
+            'li{padding:4px 0;border-bottom:1px dotted #999}'
+            '@media print{@page{margin:15mm}}'
+            '</style></head><body><h1>Список покупок</h1><ul>'
+        )
+        for name, measurement_unit, amount in ingredients:
+            yield (
+                f'<li>&#9744; {escape(name)} - {amount} '
+                f'({escape(measurement_unit)})</li>'
+            )
+        yield '</ul></body></html>'
@@ -1,17 +1,27 @@
 """Сериализаторы для API-приложения."""
 
 import base64
+from collections import defaultdict
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import (BigAutoField, F, Manager, Prefetch, Window,
+                              prefetch_related_objects)
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserCreateSerializer
 from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
                             RecipeIngredient, RecipeTag, ShoppingCart, Tag)
 from rest_framework import serializers
 from rest_framework.reverse import reverse
-from urlshort.models import ShortLink
+from urlshort.models import (ShortLink, generate_hash, normalize_url,
+                             recipe_hash)
 from users.models import Subscriber, User
 
-from foodgram.constants import PAGES_LIMIT_DEFAULT
+from foodgram.constants import (BULK_RECIPES_MAX, PAGES_LIMIT_DEFAULT,
+                                PANTRY_INGREDIENTS_MAX, PANTRY_MISSING_MAX)
+
+from .cache import get_recipe_fragments, set_recipe_fragments
 
 
 class Base64ImageField(serializers.ImageField):
@@ -49,11 +59,12 @@ class CustomUserSerializer(UserCreateSerializer):
         """Проверка подписки пользователя."""
 
         user = self.context.get('request')
-        return bool(
-            user
-            and user.user.is_authenticated
-            and Subscriber.objects.filter(author=obj, user=user.user).exists()
-        )
+        if not (user and user.user.is_authenticated):
+            return False
+        subscribed = getattr(obj, 'subscribed', None)
+        if subscribed is not None:
+            return subscribed
+        return Subscriber.objects.filter(author=obj, user=user.user).exists()
 
 
 class CustomUserCreateSerializer(CustomUserSerializer):
@@ -123,8 +134,31 @@ class IngredientRecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов, собираемый из фрагментов в кэше."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        fragments = get_recipe_fragments(recipes)
+        built = self.child.build(
+            [recipe for recipe in recipes if recipe.pk not in fragments]
+        )
+        return [
+            built[recipe.pk]
+            if recipe.pk in built
+            else self.child.overlay(recipe, fragments[recipe.pk])
+            for recipe in recipes
+        ]
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения рецепта."""
+    """
+    Сериализатор для чтения рецепта.
+
+    Общая для всех пользователей часть рецепта кэшируется, а поля
+    is_favorited, is_in_shopping_cart и author.is_subscribed
+    накладываются на неё для каждого запроса.
+    """
 
     tags = TagSerializer(many=True)
     author = CustomUserSerializer()
@@ -150,27 +184,100 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
 
-    def check_user_status(self, obj, model_class):
-        """Проверка наличия рецепта в переданном классе модели."""
+    def to_representation(self, instance):
+        fragment = get_recipe_fragments([instance]).get(instance.pk)
+        if fragment is None:
+            return self.build([instance])[instance.pk]
+        return self.overlay(instance, fragment)
+
+    def build(self, recipes):
+        """
+        Сериализация рецептов из БД с сохранением фрагментов в кэш.
+
+        Фрагменты не сохраняются, если в контексте cache_fragments=False.
+        """
+
+        if not recipes:
+            return {}
+        prefetch_related_objects(
+            recipes,
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredient_list',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+        representations = {}
+        fragments = {}
+        for recipe in recipes:
+            self.annotate_author(recipe)
+            data = super().to_representation(recipe)
+            representations[recipe.pk] = data
+            fragments[recipe.pk] = {
+                **data,
+                'author': {**data['author'], 'is_subscribed': False},
+                'is_favorited': False,
+                'is_in_shopping_cart': False,
+            }
+        if self.context.get('cache_fragments', True):
+            set_recipe_fragments(recipes, fragments)
+        return representations
+
+    def overlay(self, instance, fragment):
+        """Наложение полей текущего пользователя на фрагмент из кэша."""
+
+        self.annotate_author(instance)
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': self.fields['author'].get_is_subscribed(
+                    instance.author
+                ),
+            },
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+        }
+
+    def annotate_author(self, instance):
+        """Передача аннотации подписки на автора в его объект."""
+
+        subscribed = getattr(instance, 'author_subscribed', None)
+        if subscribed is not None:
+            instance.author.subscribed = subscribed
+
+    def check_user_status(self, obj, model_class, annotation):
+        """
+        Проверка наличия рецепта в переданном классе модели.
+
+        Если queryset уже посчитал флаг аннотацией, запрос не выполняется.
+        """
 
         request = self.context.get('request')
-        return bool(
-            request
-            and request.user.is_authenticated
-            and model_class.objects.filter(
-                recipe=obj, user=request.user).exists()
-        )
+        if not (request and request.user.is_authenticated):
+            return False
+        status = getattr(obj, annotation, None)
+        if status is not None:
+            return status
+        return model_class.objects.filter(
+            recipe=obj, user=request.user
+        ).exists()
 
     def get_is_favorited(self, obj):
         """Проверка, в избранном ли рецепт."""
 
-        return self.check_user_status(obj, FavoriteRecipe)
+        return self.check_user_status(obj, FavoriteRecipe, 'favorited')
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка, в корзине ли рецепт."""
 
-        return self.check_user_status(obj, ShoppingCart)
+        return self.check_user_status(
+            obj, ShoppingCart, 'in_shopping_cart'
+        )
 
 
 class IngredientRecipeWriteSerializer(serializers.ModelSerializer):
@@ -235,15 +342,23 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 'Поле "ingredients" не может быть пустым.'
             )
         ingredient_ids = [ingredient['id'] for ingredient in value]
-        existing_ingredients = Ingredient.objects.filter(id__in=ingredient_ids)
-        if len(existing_ingredients) != len(ingredient_ids):
-            missing_ids = set(ingredient_ids) - set(
-                existing_ingredients.values_list('id', flat=True)
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты должны быть уникальными.'
             )
+        existing_ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        if len(existing_ingredients) != len(ingredient_ids):
+            missing_ids = set(ingredient_ids) - set(existing_ingredients)
             raise serializers.ValidationError(
                 f'Ингредиенты с id {missing_ids} не существуют.'
             )
-        return value
+        return [
+            {
+                'ingredient': existing_ingredients[ingredient['id']],
+                'amount': ingredient['amount'],
+            }
+            for ingredient in value
+        ]
 
     def to_representation(self, instance):
         serializer = RecipeReadSerializer(
@@ -251,31 +366,69 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         return serializer.data
 
-    def create_tags(self, tags, recipe):
-        """Создание тегов рецепта."""
+    def save_tags(self, tags, recipe, created=False):
+        """Сохранение тегов рецепта: добавляются и удаляются только отличия."""
+
+        new_ids = {tag.id for tag in tags}
+        old_ids = set() if created else set(
+            RecipeTag.objects.filter(recipe=recipe).values_list(
+                'tag_id', flat=True
+            )
+        )
+        if old_ids - new_ids:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids
+            ).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - old_ids
+        )
 
-        recipe.tags.set(tags)
+    def save_ingredients(self, ingredients, recipe, created=False):
+        """
+        Сохранение ингредиентов рецепта.
 
-    def create_ingredients(self, ingredients, recipe):
-        """Создание ингредиентов рецепта."""
+        Добавляются, обновляются и удаляются только изменившиеся строки.
+        """
 
-        for ingredient_data in ingredients:
-            ingredient_id = ingredient_data['id']
-            ingredient = Ingredient.objects.get(pk=ingredient_id)
-            amount = ingredient_data['amount']
-            RecipeIngredient.objects.create(
-                ingredient=ingredient, recipe=recipe, amount=amount
+        new = {item['ingredient'].id: item for item in ingredients}
+        old = {} if created else {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
             )
+        }
+        if old.keys() - new.keys():
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=old.keys() - new.keys()
+            ).delete()
+        changed = []
+        for ingredient_id in old.keys() & new.keys():
+            recipe_ingredient = old[ingredient_id]
+            if recipe_ingredient.amount != new[ingredient_id]['amount']:
+                recipe_ingredient.amount = new[ingredient_id]['amount']
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=new[ingredient_id]['ingredient'],
+                amount=new[ingredient_id]['amount'],
+            )
+            for ingredient_id in new.keys() - old.keys()
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         user = self.context.get('request').user
         recipe = Recipe.objects.create(**validated_data, author=user)
-        self.create_tags(tags, recipe)
-        self.create_ingredients(ingredients, recipe)
+        self.save_tags(tags, recipe, created=True)
+        self.save_ingredients(ingredients, recipe, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.get('tags')
         if tags is None:
@@ -287,10 +440,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'ingredients': 'Это поле обязательно для заполнения.'}
             )
-        RecipeTag.objects.filter(recipe=instance).delete()
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
+        self.save_tags(validated_data.pop('tags'), instance)
+        self.save_ingredients(validated_data.pop('ingredients'), instance)
         return super().update(instance, validated_data)
 
 
@@ -310,8 +461,17 @@ class UrlshortSerializer(serializers.ModelSerializer):
         return request.build_absolute_uri(reverse('api:short_url',
                                                   args=[obj.url_hash]))
 
+    def validate_original_url(self, value):
+        return normalize_url(value)
+
     def create(self, validated_data):
-        instance, _ = ShortLink.objects.get_or_create(**validated_data)
+        recipe = validated_data['recipe']
+        url_hash = recipe_hash(recipe.id)
+        if ShortLink.objects.filter(url_hash=url_hash).exists():
+            url_hash = generate_hash()
+        instance, _ = ShortLink.objects.get_or_create(
+            recipe=recipe, defaults={**validated_data, 'url_hash': url_hash}
+        )
         return instance
 
     def to_representation(self, instance):
@@ -328,6 +488,35 @@ class RecipeSummarySerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class SubscriberListSerializer(serializers.ListSerializer):
+    """
+    Список подписок.
+
+    Первые recipes_limit рецептов всех авторов страницы загружаются
+    одним запросом с оконной функцией ROW_NUMBER().
+    """
+
+    def to_representation(self, data):
+        subscriptions = list(
+            data.all() if isinstance(data, Manager) else data
+        )
+        limit = self.child.get_recipes_limit()
+        recipes = Recipe.objects.filter(
+            author_id__in={subscription.author_id
+                           for subscription in subscriptions}
+        ).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('id').asc(),
+            )
+        ).filter(row_number__lte=limit)
+        self.child.recipes_by_author = defaultdict(list)
+        for recipe in recipes if subscriptions and limit else ():
+            self.child.recipes_by_author[recipe.author_id].append(recipe)
+        return super().to_representation(subscriptions)
+
+
 class SubscriberDetailSerializer(serializers.ModelSerializer):
     """Сериализатор подписчика с детальной информацией."""
 
@@ -356,32 +545,48 @@ class SubscriberDetailSerializer(serializers.ModelSerializer):
             'recipes_count',
             'avatar',
         )
+        list_serializer_class = SubscriberListSerializer
+
+    def get_recipes_limit(self):
+        """Количество рецептов автора из параметра recipes_limit."""
+
+        request = self.context.get('request')
+        try:
+            limit = int(
+                request.GET.get('recipes_limit', PAGES_LIMIT_DEFAULT)
+            )
+        except ValueError:
+            limit = PAGES_LIMIT_DEFAULT
+        return max(limit, 0)
 
     def get_is_subscribed(self, obj):
         """Проверка подписки на автора."""
 
         user = self.context.get('request').user
+        if obj.user_id == user.id:
+            return True
         return Subscriber.objects.filter(author=obj.author, user=user).exists()
 
     def get_recipes(self, obj):
         """Получение рецептов автора."""
 
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit', PAGES_LIMIT_DEFAULT)
-        try:
-            limit = int(limit)
-        except ValueError:
-            pass
+        recipes_by_author = getattr(self, 'recipes_by_author', None)
+        if recipes_by_author is None:
+            recipes = Recipe.objects.filter(author=obj.author)[
+                :self.get_recipes_limit()
+            ]
+        else:
+            recipes = recipes_by_author.get(obj.author_id, [])
         return RecipeSummarySerializer(
-            Recipe.objects.filter(author=obj.author)[:limit],
+            recipes,
             many=True,
-            context={'request': request},
+            context={'request': self.context.get('request')},
         ).data
 
     def get_recipes_count(self, obj):
         """Количество рецептов у автора."""
 
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
 
 class SubscriberSerializer(serializers.ModelSerializer):
@@ -406,6 +611,42 @@ class SubscriberSerializer(serializers.ModelSerializer):
         return value
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX,
+        label='Рецепты',
+    )
+
+
+class PantrySearchSerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(
+            min_value=1, max_value=BigAutoField.MAX_BIGINT
+        ),
+        allow_empty=False,
+        max_length=PANTRY_INGREDIENTS_MAX,
+        label='Ингредиенты',
+    )
+    missing = serializers.IntegerField(
+        min_value=0,
+        max_value=PANTRY_MISSING_MAX,
+        default=0,
+        label='Допустимо недостающих ингредиентов',
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.PAGES_LIMIT_MAX,
+        default=PAGES_LIMIT_DEFAULT,
+        label='Количество рецептов',
+    )
+
+
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор избранных рецептов."""
 
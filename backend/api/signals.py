@@ -0,0 +1,171 @@
+"""Сброс кэша API при изменении данных."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart, Tag)
+from users.models import Subscriber, User
+
+from . import cache
+from .indexes import pantry_index, similarity_index
+
+# Поля пользователя, которые выводятся в рецептах как поля автора.
+AUTHOR_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'avatar')
+)
+# Рецепты, изменённые за транзакцию, обновляются в индексах одним вызовом.
+similarity_updates = cache.CommitBatch(similarity_index.publish)
+pantry_updates = cache.CommitBatch(pantry_index.publish)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reset_recipes_cache(sender, instance, **kwargs):
+    """Сброс кэша списков рецептов."""
+
+    cache.bump_generations(cache.RECIPES)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reset_ingredients_cache(sender, instance, **kwargs):
+    """Сброс индекса ингредиентов."""
+
+    cache.bump_generations(cache.INGREDIENTS)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_tags_cache(sender, instance, **kwargs):
+    """Сброс индекса тегов."""
+
+    cache.bump_generations(cache.TAGS)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def reset_favorites_cache(sender, instance, **kwargs):
+    """Сброс кэша избранного пользователя."""
+
+    cache.bump_generations(cache.favorites(instance.user_id))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def reset_shopping_cart_cache(sender, instance, **kwargs):
+    """Сброс кэша корзины покупок пользователя."""
+
+    cache.bump_generations(cache.shopping_cart(instance.user_id))
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def reset_popularity_cache(sender, instance, **kwargs):
+    """Сброс кэша сортировки по популярности."""
+
+    cache.bump_generations(cache.POPULARITY)
+
+
+@receiver(post_save, sender=Subscriber)
+@receiver(post_delete, sender=Subscriber)
+def reset_subscriptions_cache(sender, instance, **kwargs):
+    """Сброс кэша подписок пользователя."""
+
+    cache.bump_generations(cache.subscriptions(instance.user_id))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def reset_recipe_relation_fragment(sender, instance, **kwargs):
+    """
+    Сброс фрагмента рецепта при изменении его тегов и ингредиентов.
+
+    Рецепты собираются за транзакцию и сбрасываются одним запросом после
+    её фиксации, поэтому удаление многих строк рецепта не даёт запрос
+    на каждую.
+    """
+
+    cache.stale_recipe_fragments.add([instance.recipe_id])
+
+
+@receiver(post_save, sender=Tag)
+def reset_tag_fragments(sender, instance, **kwargs):
+    """Сброс фрагментов рецептов с изменённым тегом."""
+
+    cache.reset_recipe_fragments(
+        RecipeTag.objects.filter(tag=instance).values_list(
+            'recipe_id', flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def reset_ingredient_fragments(sender, instance, **kwargs):
+    """Сброс фрагментов рецептов с изменённым ингредиентом."""
+
+    cache.reset_recipe_fragments(
+        RecipeIngredient.objects.filter(ingredient=instance).values_list(
+            'recipe_id', flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=User)
+def reset_author_fragments(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """
+    Сброс кэша рецептов изменённого автора.
+
+    Новые пользователи и сохранения без полей автора, которые выводятся
+    в рецептах (например, last_login), кэш не сбрасывают.
+    """
+
+    if created or (
+        update_fields is not None
+        and not AUTHOR_FIELDS.intersection(update_fields)
+    ):
+        return
+    cache.bump_generations(cache.RECIPES)
+    cache.reset_recipe_fragments(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def update_similarity_index(sender, instance, **kwargs):
+    """Обновление индекса похожих рецептов после фиксации транзакции."""
+
+    similarity_updates.add(
+        [instance.pk if sender is Recipe else instance.recipe_id]
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_pantry_index(sender, instance, **kwargs):
+    """Обновление индекса поиска по продуктам после фиксации транзакции."""
+
+    pantry_updates.add(
+        [instance.pk if sender is Recipe else instance.recipe_id]
+    )
@@ -0,0 +1,655 @@
+"""Тесты API рецептов."""
+
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from recipes.models import (FavoriteRecipe, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart, Tag)
+from users.models import Subscriber, User
+
+from . import cache as api_cache
+from .cache import get_recipe_fragments, set_recipe_fragments
+from .explain import key_requests, plan_errors, request_plans
+from .indexes import (PantryIndex, RecipeSimilarityIndex, pantry_index,
+                      similarity_index)
+from .paginations import CachedCountPaginator
+from .views import RecipeViewSet
+
+RECIPES_COUNT = 10
+INGREDIENTS_PER_RECIPE = 5
+TAGS_COUNT = 3
+
+
+class RecipeTestCase(APITestCase):
+    """Пользователи и рецепты с ингредиентами и тегами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create(
+            User(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(3)
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(TAGS_COUNT)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(INGREDIENTS_PER_RECIPE * 2)
+        )
+        Subscriber.objects.create(user=cls.users[0], author=cls.users[1])
+        cls.create_recipes(RECIPES_COUNT)
+
+    @classmethod
+    def create_recipes(cls, count):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.users[1 + number % 2],
+                name=f'Рецепт {number}',
+                text='Описание.',
+                cooking_time=10,
+                image='recipes/image.png',
+            )
+            for number in range(count)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for number, recipe in enumerate(recipes)
+            for ingredient in cls.ingredients[
+                number % INGREDIENTS_PER_RECIPE:
+            ][:INGREDIENTS_PER_RECIPE]
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in cls.tags
+        )
+        return recipes
+
+    def setUp(self):
+        cache.clear()
+
+
+class RecipeQueriesTest(RecipeTestCase):
+    """Число SQL-запросов при чтении рецептов не зависит от их количества."""
+
+    def assert_constant_queries(self, expected, user=None, **params):
+        """Одинаковое число запросов до и после удвоения рецептов."""
+
+        if user is not None:
+            self.client.force_authenticate(user)
+        for count in (RECIPES_COUNT, RECIPES_COUNT * 2):
+            if count > RECIPES_COUNT:
+                self.create_recipes(count - RECIPES_COUNT)
+            cache.clear()
+            with self.assertNumQueries(expected):
+                response = self.client.get(
+                    '/api/recipes/', {**params, 'limit': count}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_list_anonymous(self):
+        self.assert_constant_queries(4)
+
+    def test_list_authenticated(self):
+        self.assert_constant_queries(4, self.users[0])
+
+    def test_list_cursor(self):
+        self.assert_constant_queries(3, self.users[0], cursor='')
+
+    def test_list_cached_fragments(self):
+        self.client.force_authenticate(self.users[0])
+        self.client.get('/api/recipes/', {'limit': RECIPES_COUNT})
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/recipes/',
+                {'limit': RECIPES_COUNT},
+                HTTP_IF_NONE_MATCH='"stale"',
+            )
+        self.assertEqual(len(response.data['results']), RECIPES_COUNT)
+
+    def test_retrieve(self):
+        recipe = Recipe.objects.first()
+        for user in (None, self.users[0]):
+            self.client.force_authenticate(user)
+            cache.clear()
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/api/recipes/{recipe.pk}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                len(response.data['ingredients']), INGREDIENTS_PER_RECIPE
+            )
+            self.assertEqual(len(response.data['tags']), TAGS_COUNT)
+
+
+class RecipeStreamTest(RecipeTestCase):
+    """Потоковая выдача рецептов."""
+
+    def test_anonymous_forbidden(self):
+        response = self.client.get('/api/recipes/', {'stream': 1})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_does_not_fill_cache(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get('/api/recipes/', {'stream': 1})
+        self.assertEqual(response.status_code, 200)
+        items = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(items), RECIPES_COUNT)
+        self.assertFalse(get_recipe_fragments(Recipe.objects.all()))
+
+
+class RecipeCountTest(RecipeTestCase):
+    """Кэширование количества рецептов."""
+
+    @override_settings(PAGINATION_APPROXIMATE_COUNT=True)
+    def test_approximate_count_only_for_anonymous(self):
+        with mock.patch.object(
+            CachedCountPaginator, 'approximate_count', return_value=10 ** 6
+        ):
+            response = self.client.get('/api/recipes/')
+            self.assertEqual(response.data['count'], 10 ** 6)
+            self.client.force_authenticate(self.users[0])
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], RECIPES_COUNT)
+
+
+class RecipeFragmentTest(RecipeTestCase):
+    """Сброс кэша фрагментов рецептов."""
+
+    def test_stale_fragment_not_served(self):
+        recipe = Recipe.objects.first()
+        stale = Recipe.objects.get(pk=recipe.pk)
+        recipe.name = 'Новое название'
+        recipe.save()
+        set_recipe_fragments([stale], {stale.pk: {'name': stale.name}})
+        response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.data['name'], 'Новое название')
+
+    def test_author_change_resets_fragments(self):
+        author = self.users[1]
+        self.client.get('/api/recipes/')
+        author.first_name = 'Другое'
+        author.save()
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Другое'
+        )
+
+    def test_login_keeps_recipe_cache(self):
+        generation = api_cache.get_generations(api_cache.RECIPES)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].save(update_fields=['last_login'])
+            User.objects.create(
+                username='new', email='new@example.com',
+                first_name='Имя', last_name='Фамилия',
+            )
+        self.assertEqual(
+            api_cache.get_generations(api_cache.RECIPES), generation
+        )
+
+
+class RecipeBulkRelationTest(RecipeTestCase):
+    """Массовое добавление и удаление рецептов в избранном."""
+
+    def bulk(self, method, recipes):
+        """Массовый запрос к избранному с числом выполненных SQL-запросов."""
+
+        self.client.force_authenticate(self.users[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                '/api/recipes/favorite/',
+                {'recipes': [recipe.pk for recipe in recipes]},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.data['results']], len(
+            queries
+        )
+
+    def test_statuses(self):
+        first, second = Recipe.objects.all()[:2]
+        user = self.users[0]
+        FavoriteRecipe.objects.create(user=user, recipe=first)
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': [first.pk, second.pk, 10 ** 6]},
+            format='json',
+        )
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['exists', 'created', 'not_found'],
+        )
+        second.refresh_from_db()
+        self.assertEqual(second.favorites_count, 1)
+        self.assertGreater(second.popularity, 0)
+
+    def test_delete(self):
+        recipes = list(Recipe.objects.all()[:3])
+        self.bulk('post', recipes[:2])
+        statuses, _ = self.bulk('delete', recipes)
+        self.assertEqual(statuses, ['deleted', 'deleted', 'missing'])
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.favorites_count, 0)
+            self.assertAlmostEqual(recipe.popularity, 0)
+
+    def test_constant_queries(self):
+        recipes = list(Recipe.objects.all())
+        for method in ('post', 'delete'):
+            _, few = self.bulk(method, recipes[:2])
+            _, many = self.bulk(method, recipes[2:])
+            self.assertEqual(few, many)
+
+    def test_concurrent_insert_reported_as_exists(self):
+        recipe = Recipe.objects.first()
+        user = self.users[0]
+        FavoriteRecipe.objects.create(user=user, recipe=recipe)
+        self.assertEqual(
+            RecipeViewSet().insert_relations(
+                FavoriteRecipe, user, {recipe.pk}, timezone.now()
+            ),
+            set(),
+        )
+
+
+class RecipeToggleRelationTest(RecipeTestCase):
+    """Добавление рецепта в избранное и удаление из него."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.first()
+        self.url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.client.force_authenticate(self.users[0])
+
+    def test_duplicate_post(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_duplicate_delete(self):
+        self.client.post(self.url)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_other_integrity_error_not_duplicate(self):
+        with mock.patch.object(
+            RecipeViewSet, 'insert_relations', side_effect=IntegrityError
+        ):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class PopularCursorTest(RecipeTestCase):
+    """Курсор сортировки по популярности."""
+
+    def test_pages_with_equal_popularity(self):
+        Recipe.objects.filter(pk__in=Recipe.objects.all()[:3]).update(
+            popularity=1.5
+        )
+        expected = list(
+            Recipe.objects.order_by('-popularity', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        ids = []
+        params = {'ordering': 'popular', 'cursor': '', 'limit': 4}
+        while True:
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/recipes/', params)
+            ids += [item['id'] for item in response.data['results']]
+            if response.data['next'] is None:
+                break
+            params['cursor'] = parse_qs(
+                urlsplit(response.data['next']).query
+            )['cursor'][0]
+        self.assertEqual(ids, expected)
+
+
+class SimilarRecipesTest(RecipeTestCase):
+    """Похожие рецепты."""
+
+    def test_most_similar_first(self):
+        recipes = list(Recipe.objects.order_by('id'))
+        response = self.client.get(
+            f'/api/recipes/{recipes[0].pk}/similar/', {'limit': 3}
+        )
+        ids = [item['id'] for item in response.data]
+        self.assertEqual(ids[0], recipes[INGREDIENTS_PER_RECIPE].pk)
+        self.assertNotIn(recipes[0].pk, ids)
+
+    @mock.patch('api.indexes.SIMILAR_CANDIDATES_MAX', 2)
+    def test_candidates_limited(self):
+        recipe = Recipe.objects.first()
+        response = self.client.get(
+            f'/api/recipes/{recipe.pk}/similar/', {'limit': 10}
+        )
+        self.assertLessEqual(len(response.data), 2)
+
+
+class RecipeIndexJournalTest(RecipeTestCase):
+    """Обновление индексов рецептов по журналу и снимку в кэше."""
+
+    def test_other_process_applies_delta(self):
+        recipes = list(Recipe.objects.order_by('id'))
+        recipe = recipes[INGREDIENTS_PER_RECIPE]
+        other = RecipeSimilarityIndex()
+        other.similar(recipes[0].pk, 3)
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        similarity_index.publish([recipe.pk])
+        with mock.patch.object(other, 'load', side_effect=AssertionError):
+            ids = other.similar(recipes[0].pk, 3)
+        self.assertNotEqual(ids[0], recipe.pk)
+        self.assertFalse(
+            [
+                feature
+                for feature in other._features[recipe.pk]
+                if feature[0] == 'ingredient'
+            ]
+        )
+
+    def test_snapshot(self):
+        call_command('build_indexes', stdout=StringIO())
+        recipes = list(Recipe.objects.order_by('id'))
+        index = RecipeSimilarityIndex()
+        with self.assertNumQueries(0):
+            ids = index.similar(recipes[0].pk, 3)
+        self.assertEqual(ids[0], recipes[INGREDIENTS_PER_RECIPE].pk)
+
+    def test_snapshot_with_delta(self):
+        call_command('build_indexes', stdout=StringIO())
+        recipe = Recipe.objects.order_by('id')[INGREDIENTS_PER_RECIPE]
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        pantry_index.publish([recipe.pk])
+        index = PantryIndex()
+        with self.assertNumQueries(2):
+            index.refresh()
+        self.assertEqual(index._version, 1)
+
+
+class PantrySearchTest(RecipeTestCase):
+    """Поиск рецептов по имеющимся ингредиентам."""
+
+    def test_unknown_ingredient_ids(self):
+        ingredient_ids = [ingredient.pk for ingredient in self.ingredients]
+        response = self.client.get(
+            '/api/recipes/pantry/',
+            {'ingredients': ingredient_ids[:INGREDIENTS_PER_RECIPE]},
+        )
+        self.assertTrue(response.data)
+        response = self.client.get(
+            '/api/recipes/pantry/',
+            {
+                'ingredients': [
+                    *ingredient_ids[:INGREDIENTS_PER_RECIPE], 10 ** 12
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+        response = self.client.get(
+            '/api/recipes/pantry/', {'ingredients': [10 ** 20]}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_large_recipe_id(self):
+        ingredient = self.ingredients[-1]
+        recipe = Recipe.objects.create(
+            id=10 ** 12,
+            author=self.users[1],
+            name='Рецепт',
+            text='Описание.',
+            cooking_time=10,
+            image='recipes/image.png',
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=1
+        )
+        response = self.client.get(
+            '/api/recipes/pantry/', {'ingredients': [ingredient.pk]}
+        )
+        self.assertEqual(
+            [
+                (item['id'], item['matched'], item['missing'])
+                for item in response.data
+            ][0],
+            (recipe.pk, 1, 0),
+        )
+
+    def test_update(self):
+        index = PantryIndex()
+        index.refresh()
+        recipes = list(Recipe.objects.order_by('id'))
+        RecipeIngredient.objects.filter(recipe=recipes[0]).delete()
+        RecipeIngredient.objects.create(
+            recipe=recipes[0], ingredient=self.ingredients[-1], amount=1
+        )
+        deleted_id = recipes[1].pk
+        recipes[1].delete()
+        index.update([recipes[0].pk, deleted_id])
+        built = PantryIndex()
+        built.build()
+        self.assertEqual(index._recipes, built._recipes)
+        self.assertEqual(index._postings, built._postings)
+
+
+class ShortLinkTest(RecipeTestCase):
+    """Короткие ссылки на рецепты."""
+
+    def test_get_link(self):
+        recipe = Recipe.objects.first()
+        first = self.client.get(f'/api/recipes/{recipe.pk}/get-link/')
+        second = self.client.get(f'/api/recipes/{recipe.pk}/get-link/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data, second.data)
+
+    def test_missing_recipe(self):
+        for pk in ('abc', 10 ** 6):
+            response = self.client.get(f'/api/recipes/{pk}/get-link/')
+            self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTest(RecipeTestCase):
+    """SQL основных эндпоинтов читает таблицы по ожидаемым индексам."""
+
+    def assertPlans(self, user):
+        self.client.force_authenticate(user)
+        for name, url, params, indexes, scans in key_requests(user):
+            plans = request_plans(self.client, url, params)
+            with self.subTest(name, plans=plans):
+                self.assertEqual(plan_errors(plans, indexes, scans), [])
+
+    def test_key_requests(self):
+        user = self.users[0]
+        recipes = Recipe.objects.filter(author=self.users[1])[:3]
+        FavoriteRecipe.objects.bulk_create(
+            FavoriteRecipe(user=user, recipe=recipe) for recipe in recipes
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        FeedItem.objects.bulk_create(
+            FeedItem(user=user, recipe=recipe, author=recipe.author)
+            for recipe in recipes
+        )
+        self.assertPlans(user)
+
+
+class ConditionalGetTest(RecipeTestCase):
+    """Ответ 304 на условные GET-запросы."""
+
+    def assert_not_modified(self, url, header):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        validator = response[header]
+        request_header = {
+            'ETag': 'HTTP_IF_NONE_MATCH',
+            'Last-Modified': 'HTTP_IF_MODIFIED_SINCE',
+        }[header]
+        response = self.client.get(url, **{request_header: validator})
+        self.assertEqual(response.status_code, 304)
+        return validator
+
+    def test_tags(self):
+        for header in ('ETag', 'Last-Modified'):
+            self.assert_not_modified('/api/tags/', header)
+            self.assert_not_modified(f'/api/tags/{self.tags[0].pk}/', header)
+
+    def test_ingredients(self):
+        for header in ('ETag', 'Last-Modified'):
+            self.assert_not_modified('/api/ingredients/', header)
+
+    def test_recipes_without_queries(self):
+        recipe = Recipe.objects.first()
+        self.client.force_authenticate(self.users[0])
+        for url in ('/api/recipes/', f'/api/recipes/{recipe.pk}/'):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_recipe_last_modified(self):
+        recipe = Recipe.objects.first()
+        url = f'/api/recipes/{recipe.pk}/'
+        last_modified = self.assert_not_modified(url, 'Last-Modified')
+        Recipe.objects.filter(pk=recipe.pk).update(
+            updated_at=recipe.updated_at + timedelta(minutes=1)
+        )
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.users[0])
+        self.assertNotIn('Last-Modified', self.client.get(url))
+
+
+class RecipeWriteQueriesTest(RecipeTestCase):
+    """Число SQL-запросов при записи рецепта не зависит от ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.products = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Продукт {number}', measurement_unit='г')
+            for number in range(60)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.users[1])
+
+    def count_queries(self, method, url, ingredients):
+        """Запросы записи рецепта вместе с обработчиками после фиксации."""
+
+        data = {
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 2}
+                for ingredient in ingredients
+            ],
+            'name': 'Рецепт',
+            'text': 'Описание.',
+            'cooking_time': 5,
+            'image': None,
+        }
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(self.client, method)(
+                    url, data, format='json'
+                )
+        self.assertIn(response.status_code, (200, 201))
+        return len(queries)
+
+    def test_create(self):
+        self.assertEqual(
+            self.count_queries('post', '/api/recipes/', self.products[:5]),
+            self.count_queries('post', '/api/recipes/', self.products[:30]),
+        )
+
+    def test_update(self):
+        counts = []
+        for count in (5, 30):
+            recipe = Recipe.objects.create(
+                author=self.users[1], name='Рецепт', text='Описание.',
+                cooking_time=5,
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in self.products[:count]
+            )
+            counts.append(
+                self.count_queries(
+                    'patch',
+                    f'/api/recipes/{recipe.pk}/',
+                    self.products[30:30 + count],
+                )
+            )
+        self.assertEqual(counts[0], counts[1])
+
+
+class SubscriptionsQueriesTest(RecipeTestCase):
+    """Страница подписок собирается за постоянное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = User.objects.bulk_create(
+            User(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(6)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Описание.',
+                cooking_time=10,
+            )
+            for author in cls.authors
+            for number in range(3)
+        )
+
+    def test_constant_queries(self):
+        user = self.users[2]
+        self.client.force_authenticate(user)
+        subscribed = 0
+        for count in (2, 6):
+            Subscriber.objects.bulk_create(
+                Subscriber(user=user, author=author)
+                for author in self.authors[subscribed:count]
+            )
+            subscribed = count
+            with self.assertNumQueries(3):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': 2, 'limit': 10},
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+            for author in response.data['results']:
+                self.assertTrue(author['is_subscribed'])
+                self.assertEqual(len(author['recipes']), 2)
@@ -0,0 +1,9 @@
+"""Ограничения частоты запросов к API."""
+
+from rest_framework.throttling import UserRateThrottle
+
+
+class RecipeStreamThrottle(UserRateThrottle):
+    """Ограничение потоковой выдачи всех рецептов."""
+
+    scope = 'recipes_stream'
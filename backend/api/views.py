@@ -1,30 +1,53 @@
 """Вьюсеты для API-приложения."""
 
-from django.db.models import Sum
-from django.http import HttpResponse
+import json
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef, Sum, UniqueConstraint
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
 from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.reverse import reverse
+from rest_framework.utils.encoders import JSONEncoder
 
+from recipes import popularity
+from recipes.feed import feed_recipe_ids
 from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
+from urlshort import redirects
 from urlshort.models import ShortLink
 from users.models import Subscriber, User
 
+from foodgram.constants import (INGREDIENT_SEARCH_LIMIT, RECIPE_PAGE_URL,
+                                SHOPPING_LIST_TTL, SIMILAR_RECIPES_LIMIT,
+                                STREAM_CHUNK_SIZE)
+
+from . import cache as api_cache
 from .filters import IngredientFilterSet, RecipeFilterSet
-from .paginations import Pagination
+from .indexes import ingredient_index, pantry_index, similarity_index
+from .mixins import ConditionalGetMixin, UpdatedAtConditionalMixin
+from .paginations import FeedPagination, Pagination, RecipePagination
 from .permissions import IsAuthorAdminOrReadOnly
+from .renderers import (ShoppingListCSVRenderer, ShoppingListHTMLRenderer,
+                        ShoppingListNegotiation, ShoppingListTextRenderer)
 from .serializers import (AvatarSerializer, FavoriteRecipeSerializer,
-                          IngredientSerializer, RecipeReadSerializer,
+                          IngredientSerializer, PantrySearchSerializer,
+                          RecipeIdsSerializer, RecipeReadSerializer,
                           RecipeWriteSerializer, SubscriberDetailSerializer,
                           SubscriberSerializer, TagSerializer,
                           UrlshortSerializer)
+from .throttles import RecipeStreamThrottle
 
 
 class CustomUserViewSet(UserViewSet):
@@ -86,7 +109,11 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         """Получение подписок пользователя."""
 
-        subscriptions = Subscriber.objects.filter(user=request.user)
+        subscriptions = (
+            Subscriber.objects.filter(user=request.user)
+            .select_related('author')
+            .order_by('id')
+        )
         pages = self.paginate_queryset(subscriptions)
         serializer = SubscriberDetailSerializer(
             pages, many=True, context={'request': request}
@@ -124,7 +151,7 @@ class CustomUserViewSet(UserViewSet):
             )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(UpdatedAtConditionalMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
 
     queryset = Tag.objects.all()
@@ -133,7 +160,9 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    UpdatedAtConditionalMixin, viewsets.ReadOnlyModelViewSet
+):
     """Вьюсет для ингредиентов."""
 
     queryset = Ingredient.objects.all()
@@ -144,23 +173,241 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     search_fields = ('^name',)
 
+    def get_validators(self, request):
+        if self.action == 'list' and request.query_params.get('name'):
+            generation = ingredient_index.refresh()
+            return f'{request.get_full_path()}:{generation}', None
+        return super().get_validators(request)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            lambda request: Response(
+                ingredient_index.search(name, INGREDIENT_SEARCH_LIMIT)
+            ),
+            request,
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
 
     queryset = Recipe.objects.all()
-    pagination_class = Pagination
+    pagination_class = RecipePagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilterSet
     permission_classes = [IsAuthorAdminOrReadOnly]
+    relation_generations = {
+        FavoriteRecipe: api_cache.favorites,
+        ShoppingCart: api_cache.shopping_cart,
+    }
+    read_actions = ('list', 'retrieve', 'feed', 'similar', 'pantry')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.read_actions:
+            return queryset
+        queryset = queryset.select_related('author')
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                favorited=Exists(
+                    FavoriteRecipe.objects.filter(
+                        recipe=OuterRef('pk'), user=user
+                    )
+                ),
+                in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        recipe=OuterRef('pk'), user=user
+                    )
+                ),
+                author_subscribed=Exists(
+                    Subscriber.objects.filter(
+                        author=OuterRef('author'), user=user
+                    )
+                ),
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') in ('1', 'true'):
+            if not request.user.is_authenticated:
+                raise NotAuthenticated
+            throttle = RecipeStreamThrottle()
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+            queryset = self.filter_queryset(self.get_queryset())
+            return StreamingHttpResponse(
+                self.stream_json(queryset), content_type='application/json'
+            )
+        return super().list(request, *args, **kwargs)
+
+    def get_validators(self, request):
+        """
+        ETag по версиям кэша рецептов и данных пользователя.
+
+        ETag не требует запросов к БД, поэтому 304 по If-None-Match
+        отдаётся без обращения к ней. Last-Modified рецепта - его
+        updated_at; отдаётся только анонимным пользователям, так как
+        избранное, корзина и подписки в updated_at не отражаются.
+        Дата читается отдельным запросом, только если она нужна для
+        проверки If-Modified-Since, иначе берётся из отданного рецепта.
+        """
+
+        user = request.user
+        names = [api_cache.RECIPES]
+        if request.query_params.get('ordering') == 'popular':
+            names.append(api_cache.POPULARITY)
+        if user.is_authenticated:
+            names += [
+                api_cache.favorites(user.id),
+                api_cache.shopping_cart(user.id),
+                api_cache.subscriptions(user.id),
+            ]
+        generations = ':'.join(api_cache.get_generations(*names))
+        etag = f'{request.get_full_path()}:{user.id}:{generations}'
+        if not (
+            self.sends_last_modified()
+            and 'HTTP_IF_MODIFIED_SINCE' in request.META
+            and 'HTTP_IF_NONE_MATCH' not in request.META
+        ):
+            return etag, None
+        try:
+            last_modified = (
+                Recipe.objects.filter(pk=self.kwargs['pk'])
+                .values_list('updated_at', flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            last_modified = None
+        return etag, last_modified
+
+    def sends_last_modified(self):
+        """Отдаётся ли Last-Modified: только рецепт анонимному пользователю."""
+
+        return (
+            self.action == 'retrieve'
+            and not self.request.user.is_authenticated
+        )
+
+    def get_object(self):
+        recipe = super().get_object()
+        if self.sends_last_modified():
+            self.response_last_modified = recipe.updated_at
+        return recipe
+
+    def stream_json(self, queryset):
+        """
+        Потоковая выдача всех рецептов JSON-массивом без пагинации.
+
+        Рецепты читаются из БД чанками, поэтому расход памяти не зависит
+        от размера выборки. Доступна только авторизованным пользователям
+        с ограничением частоты и не заполняет кэш фрагментов.
+        """
+
+        recipes = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        context = {**self.get_serializer_context(), 'cache_fragments': False}
+        separator = '['
+        while chunk := list(islice(recipes, STREAM_CHUNK_SIZE)):
+            serializer = self.get_serializer(chunk, many=True, context=context)
+            for item in serializer.data:
+                yield separator + json.dumps(
+                    item, cls=JSONEncoder, ensure_ascii=False
+                )
+                separator = ','
+        yield ']' if separator == ',' else '[]'
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in self.read_actions:
             return RecipeReadSerializer
         elif self.action == 'get_link':
             return UrlshortSerializer
         return RecipeWriteSerializer
 
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPagination,
+        url_path='feed',
+        url_name='feed',
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+
+        ids = self.paginator.paginate_ids(
+            request, partial(feed_recipe_ids, request.user)
+        )
+        recipes = self.get_queryset().filter(id__in=ids).order_by('-id')
+        serializer = self.get_serializer(recipes, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[AllowAny],
+        url_path='pantry',
+        url_name='pantry',
+    )
+    def pantry(self, request):
+        """
+        Рецепты из имеющихся ингредиентов.
+
+        Рецепту может не хватать не больше missing ингредиентов; к каждому
+        рецепту добавляется число имеющихся и недостающих ингредиентов.
+        """
+
+        params = PantrySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        found = pantry_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data['missing'],
+            params.validated_data['limit'],
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in found]
+        )
+        found = [item for item in found if item[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in found], many=True
+        )
+        return Response(
+            [
+                dict(data, matched=matched, missing=missing)
+                for data, (_, matched, missing) in zip(serializer.data, found)
+            ]
+        )
+
+    @action(
+        detail=True,
+        methods=['GET'],
+        permission_classes=[AllowAny],
+        url_path='similar',
+        url_name='similar',
+    )
+    def similar(self, request, pk=None):
+        """Рецепты, похожие по ингредиентам и тегам."""
+
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = SIMILAR_RECIPES_LIMIT
+        limit = min(max(limit, 1), settings.PAGES_LIMIT_MAX)
+        try:
+            ids = similarity_index.similar(int(pk), limit)
+        except ValueError:
+            ids = None
+        if ids is None:
+            raise NotFound
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in ids if recipe_id in recipes],
+            many=True,
+        )
+        return Response(serializer.data)
+
     @action(
         detail=True,
         methods=['GET'],
@@ -171,18 +418,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_link(self, request, pk=None):
         """Генерация короткой ссылки на рецепт."""
 
-        self.get_object()
-        original_url = request.META.get('HTTP_REFERER')
-        if original_url is None:
-            url = reverse('api:recipe-detail', kwargs={'pk': pk})
-            original_url = request.build_absolute_uri(url)
-        serializer = self.get_serializer(
-            data={'original_url': original_url},
-            context={'request': request},
+        recipe = self.get_object()
+        link = ShortLink.objects.filter(recipe_id=recipe.id).first()
+        if link is None:
+            serializer = self.get_serializer(
+                data={
+                    'original_url': request.build_absolute_uri(
+                        RECIPE_PAGE_URL.format(id=recipe.id)
+                    )
+                },
+            )
+            serializer.is_valid(raise_exception=True)
+            link = serializer.save(recipe=recipe)
+        return Response(
+            self.get_serializer(link).data, status=status.HTTP_200_OK
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
         detail=True,
@@ -194,44 +444,278 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         """Добавление/удаление рецепта в корзину покупок."""
 
+        return self.toggle_relation(
+            request,
+            pk,
+            ShoppingCart,
+            'Рецепт "{}" уже добавлен в список покупок.',
+            'Рецепт "{}" отсутствует в списке покупок.',
+        )
+
+    def toggle_relation(
+        self, request, pk, model, exists_message, missing_message
+    ):
+        """
+        Добавление/удаление рецепта в избранное или корзину.
+
+        Повторное добавление определяется по конфликту с уникальным
+        ограничением связи (INSERT ... ON CONFLICT), удаление - по числу
+        удалённых строк, поэтому параллельные запросы не дают ошибку 500.
+        Другие нарушения целостности (рецепт удалён параллельно) не
+        считаются повтором и дают 404.
+        """
+
         user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
-            if ShoppingCart.objects.filter(recipe=recipe, user=user).exists():
+            try:
+                with transaction.atomic():
+                    created = self.add_relations(model, user, [recipe.id])
+            except IntegrityError:
+                raise NotFound
+            if not created:
                 return Response(
-                    {
-                        'detail': f'Рецепт "{recipe.name}" уже добавлен '
-                        'в список покупок.'
-                    },
+                    {'detail': exists_message.format(recipe.name)},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            ShoppingCart.objects.create(recipe=recipe, user=user)
             serializer = FavoriteRecipeSerializer(
                 recipe, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        elif request.method == 'DELETE':
-            cart_item = ShoppingCart.objects.filter(recipe__id=pk, user=user)
-            if cart_item.exists():
-                cart_item.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(
-                {
-                    'detail': f'Рецепт "{recipe.name}" отсутствует '
-                    'в списке покупок.'
-                },
-                status=status.HTTP_400_BAD_REQUEST,
+        with transaction.atomic():
+            deleted = self.remove_relations(model, user, [recipe.id])
+        if deleted:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(
+            {'detail': missing_message.format(recipe.name)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping_cart-bulk',
+    )
+    def shopping_cart_bulk(self, request):
+        """Массовое добавление/удаление рецептов в корзину покупок."""
+
+        return self.bulk_relation(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-bulk',
+    )
+    def favorite_bulk(self, request):
+        """Массовое добавление/удаление рецептов в избранное."""
+
+        return self.bulk_relation(request, FavoriteRecipe)
+
+    @transaction.atomic
+    def bulk_relation(self, request, model):
+        """
+        Добавление/удаление списка рецептов в избранное или корзину.
+
+        Возвращает статус для каждого переданного id рецепта. Статус
+        определяется по строкам, которые действительно вставлены или
+        удалены, поэтому параллельные запросы не дают двойного учёта.
+        Счётчики и популярность рецептов меняются одним UPDATE.
+        """
+
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+        existing = set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                'id', flat=True
             )
+        )
+        if request.method == 'POST':
+            statuses = ('exists', 'created')
+            changed = self.add_relations(model, user, existing)
+        else:
+            statuses = ('missing', 'deleted')
+            changed = self.remove_relations(model, user, existing)
+        return Response(
+            {
+                'results': [
+                    {
+                        'id': recipe_id,
+                        'status': (
+                            statuses[recipe_id in changed]
+                            if recipe_id in existing
+                            else 'not_found'
+                        ),
+                    }
+                    for recipe_id in recipe_ids
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def add_relations(self, model, user, recipe_ids):
+        """
+        Добавление связей пользователя с рецептами.
+
+        Счётчики и популярность добавленных рецептов меняются одним
+        UPDATE. Возвращает id рецептов, связи с которыми добавлены.
+        """
+
+        now = timezone.now()
+        created = self.insert_relations(model, user, recipe_ids, now)
+        popularity.change_events(
+            model, dict.fromkeys(created, popularity.weight(now)), 1
+        )
+        if created:
+            self.bump_relation_generations(model, user)
+        return created
+
+    def remove_relations(self, model, user, recipe_ids):
+        """
+        Удаление связей пользователя с рецептами.
+
+        Вклады удалённых событий вычитаются из популярности одним UPDATE
+        по прочитанным датам. Возвращает id рецептов, связи с которыми
+        удалены.
+        """
+
+        related = dict(
+            model.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'created_at')
+        )
+        deleted = self.delete_relations(model, user, related)
+        popularity.change_events(
+            model,
+            {
+                recipe_id: popularity.weight(related[recipe_id])
+                for recipe_id in deleted
+            },
+            -1,
+        )
+        if deleted:
+            self.bump_relation_generations(model, user)
+        return deleted
+
+    def bump_relation_generations(self, model, user):
+        """Сброс кэша избранного или корзины и популярности."""
+
+        api_cache.bump_generations(
+            self.relation_generations[model](user.id), api_cache.POPULARITY
+        )
 
     @staticmethod
-    def ingredients_to_txt(ingredients):
-        """Формирование текста с ингредиентами."""
+    def relation_sql(model):
+        """
+        Таблица и столбцы связи пользователя с рецептом для SQL.
+
+        Последний элемент - столбцы уникального ограничения связи
+        (unique_favorite, unique_shopping_cart) для ON CONFLICT.
+        """
+
+        opts = model._meta
+        quote = connection.ops.quote_name
+        unique, = (
+            constraint
+            for constraint in opts.constraints
+            if isinstance(constraint, UniqueConstraint)
+        )
+        return (
+            quote(opts.db_table),
+            *(
+                quote(opts.get_field(name).column)
+                for name in ('user', 'recipe', 'created_at')
+            ),
+            ', '.join(
+                quote(opts.get_field(name).column) for name in unique.fields
+            ),
+        )
+
+    def insert_relations(self, model, user, recipe_ids, now):
+        """
+        Вставка связей пользователя с рецептами без ошибок о повторах.
+
+        Возвращает id рецептов, строки которых действительно вставлены.
+        Конфликт проверяется только по уникальному ограничению связи,
+        остальные нарушения целостности дают IntegrityError.
+        INSERT ... ON CONFLICT DO NOTHING RETURNING поддерживают
+        PostgreSQL и SQLite 3.35+. Сигналы моделей не отправляются.
+        """
+
+        if not recipe_ids:
+            return set()
+        table, user_column, recipe_column, created_column, unique = (
+            self.relation_sql(model)
+        )
+        created_at = connection.ops.adapt_datetimefield_value(now)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'({user_column}, {recipe_column}, {created_column}) VALUES '
+                + ', '.join(['(%s, %s, %s)'] * len(recipe_ids))
+                + f' ON CONFLICT ({unique}) DO NOTHING '
+                f'RETURNING {recipe_column}',
+                [
+                    value
+                    for recipe_id in recipe_ids
+                    for value in (user.id, recipe_id, created_at)
+                ],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def delete_relations(self, model, user, recipe_ids):
+        """
+        Удаление связей пользователя с рецептами одним запросом.
+
+        Возвращает id рецептов, строки которых действительно удалены
+        (DELETE ... RETURNING). Сигналы моделей не отправляются.
+        """
+
+        if not recipe_ids:
+            return set()
+        table, user_column, recipe_column, _, _ = self.relation_sql(model)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {recipe_column} IN ('
+                + ', '.join(['%s'] * len(recipe_ids))
+                + f') RETURNING {recipe_column}',
+                [user.id, *recipe_ids],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def get_shopping_list(self, user):
+        """
+        Строки списка покупок пользователя.
+
+        Результат кэшируется до изменения корзины пользователя или
+        рецептов, а при промахе кэша строки отдаются потоком из БД.
+        """
 
-        return '\n'.join(
-            f'{ingredient["ingredient__name"]} - {ingredient["sum"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            for ingredient in ingredients
+        generations = api_cache.get_generations(
+            api_cache.shopping_cart(user.id), api_cache.RECIPES
         )
+        cache_key = f'shopping_list:{user.id}:{":".join(generations)}'
+        ingredients = cache.get(cache_key)
+        if ingredients is not None:
+            yield from ingredients
+            return
+        ingredients = []
+        queryset = (
+            RecipeIngredient.objects.filter(recipe__shoppingcarts__user=user)
+            .values_list('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(total=Sum('amount'))
+            .order_by('ingredient__name')
+        )
+        for ingredient in queryset.iterator():
+            ingredients.append(ingredient)
+            yield ingredient
+        cache.set(cache_key, ingredients, SHOPPING_LIST_TTL)
 
     @action(
         detail=False,
@@ -239,19 +723,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListHTMLRenderer,
+        ],
+        content_negotiation_class=ShoppingListNegotiation,
     )
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок в текстовом формате."""
+        """Скачивание списка покупок в формате txt, csv или html."""
 
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcarts__user=request.user
-            )
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(sum=Sum('amount'))
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(self.get_shopping_list(request.user)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
         )
-        shopping_list = self.ingredients_to_txt(ingredients)
-        return HttpResponse(shopping_list, content_type='text/plain')
+        if renderer.format != ShoppingListTextRenderer.format:
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            )
+        return response
 
     @action(
         detail=True,
@@ -263,41 +754,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def favorite(self, request, pk):
         """Добавление/удаление рецепта в избранное."""
 
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            if FavoriteRecipe.objects.filter(recipe=recipe,
-                                             user=user).exists():
-                return Response(
-                    {
-                        'detail': f'Рецепт "{recipe.name}" уже добавлен '
-                        'в избранное.'
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            FavoriteRecipe.objects.create(recipe=recipe, user=user)
-            serializer = FavoriteRecipeSerializer(
-                recipe, context={'request': request}
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        elif request.method == 'DELETE':
-            favorite_entry = FavoriteRecipe.objects.filter(
-                recipe=recipe, user=user
-            )
-            if favorite_entry.exists():
-                favorite_entry.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(
-                {
-                    'detail': f'Рецепт "{recipe.name}" не найден в избранном.'
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        return self.toggle_relation(
+            request,
+            pk,
+            FavoriteRecipe,
+            'Рецепт "{}" уже добавлен в избранное.',
+            'Рецепт "{}" не найден в избранном.',
+        )
 
 
 @require_GET
 def short_url(request, url_hash: str) -> HttpResponse:
-    """Перенаправление по короткой ссылке."""
+    """
+    Перенаправление по короткой ссылке.
+
+    Адрес берётся из кэша переходов, переход засчитывается в памяти.
+    """
 
-    original_url = get_object_or_404(ShortLink, url_hash=url_hash).original_url
+    link_id, original_url = redirects.resolve(url_hash)
+    if link_id is None:
+        raise Http404
+    redirects.clicks.add(link_id)
     return redirect(original_url)
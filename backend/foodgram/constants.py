@@ -4,6 +4,20 @@ NAME_MAX_LENGTH = 150
 
 # Default
 PAGES_LIMIT_DEFAULT = 6
+PAGES_LIMIT_MAX = 100
+STREAM_CHUNK_SIZE = 500
+
+# Cache
+PAGINATION_COUNT_TTL = 60
+APPROXIMATE_COUNT_THRESHOLD = 10000
+RECIPE_FRAGMENT_VERSION = 1
+RECIPE_FRAGMENT_TTL = 60 * 60
+INDEX_TTL = 10 * 60
+# Журнал изменений индексов рецептов: срок хранения записей и число
+# записей, после которого процесс загружает снимок вместо журнала.
+INDEX_DELTA_TTL = 24 * 60 * 60
+INDEX_DELTA_MAX = 1000
+SHOPPING_LIST_TTL = 24 * 60 * 60
 
 # Tag
 TAG_MAX_LENGTH = 32
@@ -12,10 +26,30 @@ SLUG_REGEXVALIDATOR = r'^[-a-zA-Z0-9_]+$'
 # Ingredient
 INGREDIENT_MAX_LENGTH = 128
 UNIT_INGREDIENT_MAX_LENGTH = 64
+INGREDIENT_SEARCH_LIMIT = 30
+INGREDIENT_LOAD_BATCH_SIZE = 5000
 
 # Recipe
 RECIPE_MAX_LENGTH = 256
 COOKING_MIN_TIME = 1
+BULK_RECIPES_MAX = 100
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_CANDIDATES_MAX = 2000
+PANTRY_INGREDIENTS_MAX = 100
+PANTRY_MISSING_MAX = 10
+# Период полураспада вклада в популярность, сек.
+POPULARITY_HALF_LIFE = 7 * 24 * 60 * 60
+# Точка отсчёта для весов популярности: 2026-01-01 UTC. Вес удваивается
+# каждый период полураспада, поэтому раз в несколько лет точку стоит
+# сдвигать с запуском update_popularity.
+POPULARITY_EPOCH = 1767225600
+
+# Feed
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+# Раскладка возобновляется с запасом, чтобы подписки и отписки на границе
+# не переключали режим автора на каждом запросе.
+FEED_FANOUT_RESUME_FOLLOWERS = 4000
+FEED_BATCH_SIZE = 1000
 
 # RecipeIngredient
 AMOUNT_MIN = 1
@@ -25,3 +59,11 @@ MIN_HASH_LENGTH = 8
 MAX_HASH_LENGTH = 10
 HASH_FIELD_LENGTH = 15
 MAX_URL_LENGTH = 256
+RECIPE_PAGE_URL = '/recipes/{id}'
+SHORT_LINK_LRU_SIZE = 10000
+SHORT_LINK_CACHE_TTL = 10 * 60
+SHORT_LINK_MISSING_TTL = 60
+SHORT_LINK_FLUSH_INTERVAL = 10
+# Ключ перестановки id рецепта в код: множитель взаимно прост с 62.
+RECIPE_HASH_MULTIPLIER = 134941236371453
+RECIPE_HASH_OFFSET = 90271530648817
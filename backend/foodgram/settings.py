@@ -5,6 +5,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from foodgram.constants import PAGES_LIMIT_MAX
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -91,6 +93,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -140,6 +155,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+PAGES_LIMIT_MAX = int(os.getenv('PAGES_LIMIT_MAX', PAGES_LIMIT_MAX))
+
+PAGINATION_APPROXIMATE_COUNT = (
+    os.getenv('PAGINATION_APPROXIMATE_COUNT', 'False') == 'True'
+)
+
+SHORT_LINK_SHARED_CACHE = (
+    os.getenv('SHORT_LINK_SHARED_CACHE', 'False') == 'True'
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -148,6 +173,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'recipes_stream': os.getenv('RECIPES_STREAM_RATE', '10/hour'),
+    },
 }
 
 DJOSER = {
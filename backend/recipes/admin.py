@@ -64,7 +64,16 @@ class RecipeAdmin(admin.ModelAdmin):
         )
 
     inlines = [RecipeTagInline, RecipeIngredientInline]
-    list_display = ('id', 'name', 'author', 'get_tags', 'get_ingredients')
+    list_display = (
+        'id',
+        'name',
+        'author',
+        'get_tags',
+        'get_ingredients',
+        'favorites_count',
+        'shopping_carts_count',
+    )
+    readonly_fields = ('favorites_count', 'shopping_carts_count')
     list_display_links = ('name',)
     list_filter = ('name',)
     search_fields = ('name',)
@@ -0,0 +1,66 @@
+"""Денормализованные счётчики рецептов, избранного и корзины."""
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscriber, User
+
+from .models import FavoriteRecipe, Recipe, ShoppingCart
+
+# (модель со счётчиком, поле счётчика, считаемая модель, поле связи)
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscriber, 'author'),
+)
+
+
+def change_counter(model, pk, counter, delta):
+    """Атомарное изменение счётчика через F()."""
+
+    model.objects.filter(pk=pk).update(
+        **{counter: Greatest(F(counter) + delta, 0)}
+    )
+
+
+def actual_count(related_model, field):
+    """Подзапрос с фактическим количеством связанных объектов."""
+
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def recount(model, counter, related_model, field, pks=None):
+    """Пересчёт счётчика для всех объектов или только для pks."""
+
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.update(**{counter: actual_count(related_model, field)})
+
+
+def find_drift(model, counter, related_model, field):
+    """Объекты, у которых счётчик расходится с фактическим значением."""
+
+    return (
+        model.objects.annotate(actual=actual_count(related_model, field))
+        .exclude(**{counter: F('actual')})
+        .values_list('pk', counter, 'actual')
+    )
+
+
+def recount_related(related_model, pks):
+    """Пересчёт счётчиков объектов pks, зависящих от related_model."""
+
+    for model, counter, counted_model, field in COUNTERS:
+        if counted_model is related_model:
+            recount(model, counter, counted_model, field, pks)
@@ -0,0 +1,241 @@
+"""
+Лента рецептов от авторов, на которых подписан пользователь.
+
+Рецепты обычных авторов раскладываются по лентам подписчиков при
+публикации (fan-out on write). Рецепты авторов с большим числом
+подписчиков в ленты не пишутся и подмешиваются при чтении слиянием
+отсортированных потоков (fan-out on read).
+
+Режим хранится в User.feed_fanout. К чтению автор переходит сразу при
+подписке, а к раскладке возвращается командой resume_feed_fanout: она
+пачками раскладывает рецепты автора по лентам подписчиков и только
+потом меняет режим. Записи, оставшиеся после перехода к чтению,
+отбрасываются как повторы при слиянии.
+"""
+
+from heapq import merge
+from itertools import islice
+
+from django.db import transaction
+
+from users.models import Subscriber, User
+
+from foodgram.constants import (FEED_BATCH_SIZE, FEED_FANOUT_MAX_FOLLOWERS,
+                                FEED_FANOUT_RESUME_FOLLOWERS)
+
+from .models import FeedItem, Recipe
+
+
+def is_fanout_author(author_id):
+    """
+    Раскладываются ли рецепты автора по лентам подписчиков.
+
+    Строка автора блокируется до конца транзакции, чтобы смена режима
+    не разминулась с публикацией рецепта или подпиской.
+    """
+
+    return (
+        User.objects.select_for_update()
+        .filter(pk=author_id)
+        .values_list('feed_fanout', flat=True)
+        .first()
+    )
+
+
+def bulk_insert(items):
+    """Вставка записей ленты пачками по FEED_BATCH_SIZE."""
+
+    items = iter(items)
+    while batch := list(islice(items, FEED_BATCH_SIZE)):
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def author_items(author_id, user_ids, recipe_ids):
+    """Записи лент подписчиков user_ids с рецептами автора recipe_ids."""
+
+    for user_id in user_ids:
+        for recipe_id in recipe_ids:
+            yield FeedItem(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id
+            )
+
+
+def author_recipe_ids(author_id, after=0):
+    """Id рецептов автора, большие after."""
+
+    return list(
+        Recipe.objects.filter(author_id=author_id, id__gt=after).values_list(
+            'id', flat=True
+        )
+    )
+
+
+def update_mode(author_id):
+    """
+    Переход автора к чтению, если подписчиков больше порога раскладки.
+
+    Ленты при этом не меняются, обратный переход выполняет
+    resume_fanout в фоне.
+    """
+
+    User.objects.filter(
+        pk=author_id,
+        feed_fanout=True,
+        followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS,
+    ).update(feed_fanout=False)
+
+
+def resumable_authors():
+    """Id авторов в режиме чтения, которых можно вернуть к раскладке."""
+
+    return User.objects.filter(
+        feed_fanout=False,
+        followers_count__lte=FEED_FANOUT_RESUME_FOLLOWERS,
+    ).values_list('id', flat=True)
+
+
+def lock_resumable(author_id):
+    """Блокировка автора, если его ещё можно вернуть к раскладке."""
+
+    return (
+        User.objects.select_for_update()
+        .filter(
+            pk=author_id,
+            feed_fanout=False,
+            followers_count__lte=FEED_FANOUT_RESUME_FOLLOWERS,
+        )
+        .exists()
+    )
+
+
+def resume_fanout(author_id):
+    """
+    Возврат автора к раскладке по лентам.
+
+    Подписчики обрабатываются пачками в отдельных транзакциях так, чтобы
+    каждая вставляла около FEED_BATCH_SIZE записей. Пока идёт раскладка,
+    автор остаётся в режиме чтения, и его рецепты подмешиваются в ленты
+    при чтении. Последняя транзакция дополняет ленты рецептами,
+    опубликованными за время раскладки, и меняет режим. Возвращает
+    False, если автор за это время снова перестал подходить.
+    """
+
+    recipe_ids = author_recipe_ids(author_id)
+    last_recipe_id = max(recipe_ids, default=0)
+    batch_size = max(FEED_BATCH_SIZE // max(len(recipe_ids), 1), 1)
+    last_subscription_id = 0
+    while True:
+        with transaction.atomic():
+            if not lock_resumable(author_id):
+                return False
+            subscriptions = list(
+                Subscriber.objects.filter(
+                    author_id=author_id, id__gt=last_subscription_id
+                )
+                .order_by('id')
+                .values_list('id', 'user_id')[:batch_size]
+            )
+            if not subscriptions:
+                bulk_insert(
+                    author_items(
+                        author_id,
+                        Subscriber.objects.filter(author_id=author_id)
+                        .values_list('user_id', flat=True)
+                        .iterator(chunk_size=FEED_BATCH_SIZE),
+                        author_recipe_ids(author_id, last_recipe_id),
+                    )
+                )
+                User.objects.filter(pk=author_id).update(feed_fanout=True)
+                return True
+            bulk_insert(
+                author_items(
+                    author_id,
+                    [user_id for _, user_id in subscriptions],
+                    recipe_ids,
+                )
+            )
+            last_subscription_id = subscriptions[-1][0]
+
+
+@transaction.atomic
+def fan_out(recipe):
+    """Добавление нового рецепта в ленты подписчиков автора."""
+
+    if not is_fanout_author(recipe.author_id):
+        return
+    followers = (
+        Subscriber.objects.filter(author_id=recipe.author_id)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+    bulk_insert(
+        FeedItem(
+            user_id=user_id, recipe_id=recipe.pk, author_id=recipe.author_id
+        )
+        for user_id in followers
+    )
+
+
+@transaction.atomic
+def backfill(subscription):
+    """Заполнение ленты рецептами автора при подписке."""
+
+    if is_fanout_author(subscription.author_id):
+        bulk_insert(
+            author_items(
+                subscription.author_id,
+                [subscription.user_id],
+                author_recipe_ids(subscription.author_id),
+            )
+        )
+    update_mode(subscription.author_id)
+
+
+@transaction.atomic
+def clear(subscription):
+    """
+    Удаление рецептов автора из ленты при отписке.
+
+    Автор блокируется до удаления, чтобы пачка resume_fanout не вернула
+    в ленту записи после него.
+    """
+
+    is_fanout_author(subscription.author_id)
+    FeedItem.objects.filter(
+        user_id=subscription.user_id, author_id=subscription.author_id
+    ).delete()
+
+
+def feed_recipe_ids(user, limit, before=None):
+    """
+    Id рецептов ленты по убыванию, меньшие before, не больше limit.
+
+    Каждый источник - диапазон по индексу не длиннее limit: записи
+    ленты и рецепты каждого автора без раскладки. Источники сливаются
+    k-way merge, повторы (записи, оставшиеся от режима раскладки)
+    отбрасываются.
+    """
+
+    timeline = FeedItem.objects.filter(user=user)
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+    sources = [
+        timeline.order_by('-recipe_id').values_list('recipe_id', flat=True)
+    ]
+    authors = Subscriber.objects.filter(
+        user=user, author__feed_fanout=False
+    ).values_list('author_id', flat=True)
+    for author_id in authors:
+        recipes = Recipe.objects.filter(author_id=author_id)
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        sources.append(recipes.order_by('-id').values_list('id', flat=True))
+    ids = []
+    for recipe_id in merge(
+        *(source[:limit] for source in sources), reverse=True
+    ):
+        if not ids or ids[-1] != recipe_id:
+            ids.append(recipe_id)
+            if len(ids) == limit:
+                break
+    return ids
@@ -0,0 +1,357 @@
+"""Генерация синтетических данных для нагрузочного тестирования."""
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import cache as api_cache
+from recipes import popularity
+from recipes.counters import COUNTERS, recount
+from recipes.models import (FavoriteRecipe, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart, Tag)
+from urlshort.models import ShortLink, recipe_hash
+from users.models import Subscriber, User
+
+from foodgram.constants import (FEED_BATCH_SIZE, FEED_FANOUT_MAX_FOLLOWERS,
+                                RECIPE_PAGE_URL)
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+# Показатели степенных распределений: чем больше, тем сильнее перекос.
+AUTHOR_SKEW = 1.1
+FOLLOWED_SKEW = 1.2
+RECIPE_SKEW = 1.0
+INGREDIENT_SKEW = 1.0
+EVENTS_PERIOD_DAYS = 90
+MAX_PAIR_ROUNDS = 10
+
+
+class Zipf:
+    """Выбор элементов по закону Ципфа; ранги назначаются случайно."""
+
+    def __init__(self, rng, items, skew):
+        self.random = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(
+            accumulate(1 / rank ** skew for rank in range(1, len(items) + 1))
+        )
+
+    def sample(self, count):
+        return self.random.choices(
+            self.items, cum_weights=self.cum_weights, k=count
+        )
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """Отключение auto_now_add у created_at, чтобы задать даты событий."""
+
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    """Заполнение БД синтетическими пользователями и рецептами."""
+
+    help = (
+        'Создаёт пользователей, рецепты, избранное, корзины, подписки и '
+        'короткие ссылки со степенными распределениями популярности.'
+    )
+
+    def add_arguments(self, parser):
+        sizes = (
+            ('users', 1000, 'Количество пользователей.'),
+            ('recipes', 10000, 'Количество рецептов.'),
+            ('subscriptions', 20000, 'Количество подписок.'),
+            ('favorites', 50000, 'Количество добавлений в избранное.'),
+            ('carts', 20000, 'Количество добавлений в корзину.'),
+            ('short-links', 2000, 'Количество коротких ссылок.'),
+        )
+        for name, default, help_text in sizes:
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help_text
+            )
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Зерно генератора.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=FEED_BATCH_SIZE,
+            help='Размер пачки bulk_create.',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов, сначала выполните load_ingredients.'
+            )
+        with transaction.atomic():
+            tag_ids = self.get_tags()
+            user_ids = self.create_users(options['users'])
+            recipes = self.create_recipes(options['recipes'], user_ids)
+            popular_recipes = Zipf(
+                self.random, [recipe_id for recipe_id, _ in recipes],
+                RECIPE_SKEW,
+            )
+            self.create_recipe_links(
+                popular_recipes.items,
+                Zipf(self.random, ingredient_ids, INGREDIENT_SKEW),
+                tag_ids,
+            )
+            subscriptions = self.unique_pairs(
+                options['subscriptions'],
+                user_ids,
+                Zipf(self.random, user_ids, FOLLOWED_SKEW),
+            )
+            self.insert(
+                Subscriber,
+                (
+                    Subscriber(user_id=user_id, author_id=author_id)
+                    for user_id, author_id in subscriptions
+                ),
+            )
+            with explicit_created_at(FavoriteRecipe, ShoppingCart):
+                for model, count in (
+                    (FavoriteRecipe, options['favorites']),
+                    (ShoppingCart, options['carts']),
+                ):
+                    self.create_events(
+                        model, count, user_ids, popular_recipes
+                    )
+            self.create_short_links(options['short_links'], popular_recipes)
+            self.recount()
+            self.create_feed(subscriptions, recipes)
+            api_cache.bump_generations(
+                api_cache.RECIPES,
+                api_cache.POPULARITY,
+                api_cache.SIMILARITY,
+                api_cache.PANTRY,
+                api_cache.TAGS,
+            )
+        call_command('build_indexes', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+
+    def insert(self, model, objects, **kwargs):
+        """Вставка объектов пачками с выводом прогресса."""
+
+        objects = iter(objects)
+        inserted = 0
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch, **kwargs)
+            inserted += len(batch)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {inserted}', ending='\r'
+            )
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {inserted}')
+
+    def new_ids(self, model, last_id):
+        """Id объектов, созданных после last_id."""
+
+        return list(
+            model.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+    def last_id(self, model):
+        """Наибольший id модели или 0."""
+
+        return (
+            model.objects.order_by('-id').values_list('id', flat=True).first()
+            or 0
+        )
+
+    def get_tags(self):
+        """Id тегов, при их отсутствии создаются стандартные."""
+
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        """Пользователи с общим паролем 'password'."""
+
+        last_id = self.last_id(User)
+        password = make_password('password')
+        self.insert(
+            User,
+            (
+                User(
+                    username=f'user{number}',
+                    email=f'user{number}@example.com',
+                    first_name='Имя',
+                    last_name=f'Фамилия{number}',
+                    password=password,
+                )
+                for number in range(last_id + 1, last_id + count + 1)
+            ),
+        )
+        return self.new_ids(User, last_id)
+
+    def create_recipes(self, count, user_ids):
+        """Рецепты; авторы выбираются с тяжёлым хвостом."""
+
+        last_id = self.last_id(Recipe)
+        authors = Zipf(self.random, user_ids, AUTHOR_SKEW).sample(count)
+        self.insert(
+            Recipe,
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    text=f'Описание рецепта {number}.',
+                    cooking_time=self.random.randint(5, 180),
+                )
+                for number, author_id in enumerate(authors, last_id + 1)
+            ),
+        )
+        return list(
+            Recipe.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'author_id')
+        )
+
+    def create_recipe_links(self, recipe_ids, ingredients, tag_ids):
+        """Ингредиенты (популярные чаще) и теги рецептов."""
+
+        def recipe_ingredients():
+            for recipe_id in sorted(recipe_ids):
+                size = min(self.random.randint(3, 12), len(ingredients.items))
+                chosen = {}
+                while len(chosen) < size:
+                    chosen.update(dict.fromkeys(ingredients.sample(size)))
+                for ingredient_id in islice(chosen, size):
+                    yield RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.random.randint(1, 500),
+                    )
+
+        def recipe_tags():
+            for recipe_id in sorted(recipe_ids):
+                size = self.random.randint(1, min(3, len(tag_ids)))
+                for tag_id in self.random.sample(tag_ids, size):
+                    yield RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+
+        self.insert(RecipeIngredient, recipe_ingredients())
+        self.insert(RecipeTag, recipe_tags())
+
+    def unique_pairs(self, count, left, right):
+        """
+        До count различных пар: left выбирается равномерно, right - по Ципфу.
+
+        Пары из одинаковых элементов отбрасываются.
+        """
+
+        pairs = set()
+        for _ in range(MAX_PAIR_ROUNDS):
+            needed = count - len(pairs)
+            if needed <= 0:
+                break
+            pairs.update(
+                pair
+                for pair in zip(
+                    self.random.choices(left, k=needed), right.sample(needed)
+                )
+                if pair[0] != pair[1]
+            )
+        return sorted(pairs)
+
+    def create_events(self, model, count, user_ids, recipes):
+        """Избранное или корзина: популярные рецепты выбираются чаще."""
+
+        pairs = self.unique_pairs(count, user_ids, recipes)
+        period = timedelta(days=EVENTS_PERIOD_DAYS).total_seconds()
+        self.insert(
+            model,
+            (
+                model(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    created_at=self.now - timedelta(
+                        seconds=self.random.uniform(0, period)
+                    ),
+                )
+                for user_id, recipe_id in pairs
+            ),
+        )
+
+    def create_short_links(self, count, recipes):
+        """Короткие ссылки популярных рецептов."""
+
+        linked = sorted(
+            set(recipes.sample(count))
+            - set(ShortLink.objects.values_list('recipe_id', flat=True))
+        )
+        self.insert(
+            ShortLink,
+            (
+                ShortLink(
+                    recipe_id=recipe_id,
+                    url_hash=recipe_hash(recipe_id),
+                    original_url=RECIPE_PAGE_URL.format(id=recipe_id),
+                    clicks=int(self.random.paretovariate(1.2) * 10),
+                )
+                for recipe_id in linked
+            ),
+            ignore_conflicts=True,
+        )
+
+    def recount(self):
+        """Пересчёт счётчиков и популярности после bulk_create."""
+
+        for model, counter, related_model, field in COUNTERS:
+            recount(model, counter, related_model, field)
+        popularity.recompute()
+
+    def create_feed(self, subscriptions, recipes):
+        """Ленты подписчиков для авторов без раскладки при чтении."""
+
+        recipes_by_author = {}
+        for recipe_id, author_id in recipes:
+            recipes_by_author.setdefault(author_id, []).append(recipe_id)
+        User.objects.filter(
+            followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS
+        ).update(feed_fanout=False)
+        fanout_authors = set(
+            User.objects.filter(
+                id__in=recipes_by_author, feed_fanout=True
+            ).values_list('id', flat=True)
+        )
+        self.insert(
+            FeedItem,
+            (
+                FeedItem(user_id=user_id, recipe_id=recipe_id,
+                         author_id=author_id)
+                for user_id, author_id in subscriptions
+                if author_id in fanout_authors
+                for recipe_id in recipes_by_author[author_id]
+            ),
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,240 @@
+"""Загрузка каталога ингредиентов из CSV или JSON."""
+
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api import cache as api_cache
+from recipes.models import Ingredient, RecipeIngredient
+
+from foodgram.constants import (INGREDIENT_LOAD_BATCH_SIZE,
+                                INGREDIENT_MAX_LENGTH,
+                                UNIT_INGREDIENT_MAX_LENGTH)
+
+JSON_READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Строки CSV с заголовком name,measurement_unit."""
+
+    for row in csv.DictReader(file):
+        yield row.get('name'), row.get('measurement_unit')
+
+
+def read_json(file):
+    """
+    Объекты JSON-массива по одному, без чтения файла целиком.
+
+    Файл читается блоками, объекты разбираются raw_decode по мере
+    поступления.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(JSON_READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив объектов.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Некорректный JSON.')
+                break
+            if not isinstance(item, dict):
+                raise CommandError('Ожидается JSON-массив объектов.')
+            yield item.get('name'), item.get('measurement_unit')
+        if not chunk:
+            return
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+class Command(BaseCommand):
+    """Загрузка и обновление каталога ингредиентов."""
+
+    help = (
+        'Загружает ингредиенты из CSV или JSON. Существующие ингредиенты '
+        'с тем же названием обновляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу с ингредиентами.')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Формат файла; по умолчанию - по расширению.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать изменения, не записывая их.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INGREDIENT_LOAD_BATCH_SIZE,
+            help='Размер пачки записи.',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}.')
+        self.batch_size = options['batch_size']
+        try:
+            with path.open(encoding='utf-8-sig', newline='') as file:
+                rows = self.read(READERS[file_format](file))
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}.')
+        if options['dry_run']:
+            created, updated = self.diff(rows)
+            self.stdout.write(
+                f'Будет добавлено: {len(created)}, '
+                f'обновлено: {len(updated)}.'
+            )
+            return
+        started = timezone.now()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                created, updated = self.copy(rows, started)
+            else:
+                created, updated = self.upsert(rows)
+            self.reset_caches(started)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Добавлено: {created}, обновлено: {updated}.'
+            )
+        )
+
+    def read(self, items):
+        """Проверенные строки без повторов: {название: единица}."""
+
+        rows = {}
+        skipped = 0
+        for number, (name, measurement_unit) in enumerate(items, 1):
+            name = (name or '').strip()
+            measurement_unit = (measurement_unit or '').strip()
+            if (
+                not name
+                or not measurement_unit
+                or len(name) > INGREDIENT_MAX_LENGTH
+                or len(measurement_unit) > UNIT_INGREDIENT_MAX_LENGTH
+            ):
+                skipped += 1
+                continue
+            rows[name] = measurement_unit
+            if number % self.batch_size == 0:
+                self.stdout.write(f'Прочитано строк: {number}.')
+        self.stdout.write(
+            f'Уникальных ингредиентов: {len(rows)}, пропущено: {skipped}.'
+        )
+        return rows
+
+    def diff(self, rows):
+        """Новые и изменённые ингредиенты относительно БД."""
+
+        existing = dict(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        created = []
+        updated = []
+        for name, measurement_unit in rows.items():
+            if name not in existing:
+                created.append(name)
+            elif existing[name] != measurement_unit:
+                updated.append(name)
+        return created, updated
+
+    def upsert(self, rows):
+        """Запись пачками bulk_create с обновлением при конфликте."""
+
+        created, updated = self.diff(rows)
+        changed = iter(created + updated)
+        written = 0
+        while batch := list(islice(changed, self.batch_size)):
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=rows[name])
+                    for name in batch
+                ],
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=['measurement_unit', 'updated_at'],
+            )
+            written += len(batch)
+            self.stdout.write(f'Записано: {written}.')
+        return len(created), len(updated)
+
+    def copy(self, rows, started):
+        """
+        Загрузка через COPY во временную таблицу и один INSERT.
+
+        Обновляются только ингредиенты с изменившейся единицей измерения.
+        """
+
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        items = iter(rows.items())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            copied = 0
+            while batch := list(islice(items, self.batch_size)):
+                buffer = io.StringIO()
+                csv.writer(buffer, lineterminator='\n').writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+                copied += len(batch)
+                self.stdout.write(f'Скопировано: {copied}.')
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit, updated_at) '
+                'SELECT name, measurement_unit, %s FROM ingredient_staging '
+                'ON CONFLICT (name) DO UPDATE SET '
+                'measurement_unit = EXCLUDED.measurement_unit, '
+                'updated_at = EXCLUDED.updated_at '
+                f'WHERE {table}.measurement_unit '
+                'IS DISTINCT FROM EXCLUDED.measurement_unit '
+                'RETURNING xmax = 0',
+                [started],
+            )
+            inserted = [row[0] for row in cursor.fetchall()]
+        return inserted.count(True), inserted.count(False)
+
+    def reset_caches(self, started):
+        """Сброс индекса ингредиентов и фрагментов затронутых рецептов."""
+
+        api_cache.bump_generations(api_cache.INGREDIENTS, api_cache.RECIPES)
+        api_cache.reset_recipe_fragments(
+            RecipeIngredient.objects.filter(
+                ingredient__updated_at__gte=started
+            )
+            .values_list('recipe_id', flat=True)
+            .distinct()
+        )
@@ -0,0 +1,51 @@
+"""Пересчёт денормализованных счётчиков."""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import COUNTERS, find_drift, recount
+
+
+class Command(BaseCommand):
+    """Поиск и исправление расхождений в счётчиках."""
+
+    help = (
+        'Сверяет счётчики рецептов, избранного и корзины с фактическими '
+        'данными и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сообщить о расхождениях, не исправляя их.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, counter, related_model, field in COUNTERS:
+            drift = list(find_drift(model, counter, related_model, field))
+            total += len(drift)
+            for pk, stored, actual in drift:
+                self.stdout.write(
+                    f'{model.__name__} {pk}: {counter}={stored}, '
+                    f'фактически {actual}'
+                )
+            if drift and not options['check']:
+                with transaction.atomic():
+                    recount(
+                        model,
+                        counter,
+                        related_model,
+                        field,
+                        [pk for pk, _, _ in drift],
+                    )
+        if options['check'] and total:
+            raise CommandError(f'Найдено расхождений: {total}.')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Исправлено расхождений: {total}.'
+                if total
+                else 'Расхождений нет.'
+            )
+        )
@@ -0,0 +1,23 @@
+"""Возврат авторов к раскладке рецептов по лентам."""
+
+from django.core.management.base import BaseCommand
+
+from recipes.feed import resumable_authors, resume_fanout
+
+
+class Command(BaseCommand):
+    """Раскладка рецептов авторов, у которых стало меньше подписчиков."""
+
+    help = (
+        'Возвращает к раскладке по лентам авторов в режиме чтения, у '
+        'которых подписчиков не больше порога возврата. Ленты '
+        'заполняются пачками, запускать периодически.'
+    )
+
+    def handle(self, *args, **options):
+        resumed = sum(
+            resume_fanout(author_id) for author_id in list(resumable_authors())
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Возвращено к раскладке авторов: {resumed}.')
+        )
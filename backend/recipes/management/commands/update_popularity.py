@@ -0,0 +1,46 @@
+"""Пересчёт популярности рецептов."""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api import cache as api_cache
+from recipes.popularity import EVENT_MODELS, recompute
+
+
+class Command(BaseCommand):
+    """Пересчёт популярности по событиям избранного и корзины."""
+
+    help = (
+        'Пересчитывает популярность рецептов. С --since пересчитываются '
+        'только рецепты с событиями за последние N часов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=int,
+            metavar='HOURS',
+            help='Пересчитать только рецепты с недавними событиями.',
+        )
+
+    def handle(self, *args, **options):
+        pks = None
+        if options['since'] is not None:
+            moment = timezone.now() - timedelta(hours=options['since'])
+            pks = set()
+            for model in EVENT_MODELS:
+                pks.update(
+                    model.objects.filter(created_at__gte=moment).values_list(
+                        'recipe_id', flat=True
+                    )
+                )
+        with transaction.atomic():
+            changed = recompute(pks)
+            if changed:
+                api_cache.bump_generations(api_cache.POPULARITY)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлена популярность рецептов: {changed}.')
+        )
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Заполнение счётчиков по существующим данным."""
+
+    Recipe = apps.get_model("recipes", "Recipe")
+    FavoriteRecipe = apps.get_model("recipes", "FavoriteRecipe")
+    ShoppingCart = apps.get_model("recipes", "ShoppingCart")
+    User = apps.get_model("users", "User")
+    counters = (
+        (Recipe, "favorites_count", FavoriteRecipe, "recipe"),
+        (Recipe, "shopping_carts_count", ShoppingCart, "recipe"),
+        (User, "recipes_count", Recipe, "author"),
+    )
+    for model, counter, related_model, field in counters:
+        model.objects.update(
+            **{
+                counter: Coalesce(
+                    Subquery(
+                        related_model.objects.filter(**{field: OuterRef("pk")})
+                        .order_by()
+                        .values(field)
+                        .annotate(count=Count("pk"))
+                        .values("count")
+                    ),
+                    0,
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        ("recipes", "0002_updated_at"),
+        ("users", "0002_recipes_count"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="recipe",
+            name="is_favorited",
+        ),
+        migrations.RemoveField(
+            model_name="recipe",
+            name="is_in_shopping_cart",
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Добавлений в избранное"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="shopping_carts_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Добавлений в корзину"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
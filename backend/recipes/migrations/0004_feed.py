@@ -0,0 +1,101 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from itertools import islice
+
+FEED_BATCH_SIZE = 1000
+
+
+def fill_feed(apps, schema_editor):
+    """
+    Заполнение лент по существующим подпискам.
+
+    Пары подписчик-рецепт авторов в режиме раскладки читаются одним
+    запросом с соединением подписок и рецептов.
+    """
+
+    Subscriber = apps.get_model("users", "Subscriber")
+    FeedItem = apps.get_model("recipes", "FeedItem")
+    rows = (
+        Subscriber.objects.filter(
+            author__feed_fanout=True, author__recipes__isnull=False
+        )
+        .values_list("user_id", "author__recipes__id", "author_id")
+        .iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+    items = (
+        FeedItem(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id, recipe_id, author_id in rows
+    )
+    while batch := list(islice(items, FEED_BATCH_SIZE)):
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("recipes", "0003_counters"),
+        ("users", "0003_followers_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Автор",
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_items",
+                        to="recipes.recipe",
+                        verbose_name="Рецепт",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Подписчик",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись ленты",
+                "verbose_name_plural": "Лента подписок",
+                "indexes": [
+                    models.Index(fields=["user", "author"], name="feed_user_author_idx")
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="feeditem",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_feed_item"
+            ),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:35
+
+from django.db import migrations, models
+import django.utils.timezone
+import math
+from django.db.models import F
+
+POPULARITY_HALF_LIFE = 7 * 24 * 60 * 60
+POPULARITY_EPOCH = 1767225600
+
+
+def fill_popularity(apps, schema_editor):
+    """Начальная популярность: все события считаются произошедшими сейчас."""
+
+    Recipe = apps.get_model("recipes", "Recipe")
+    weight = math.exp(
+        math.log(2)
+        / POPULARITY_HALF_LIFE
+        * (django.utils.timezone.now().timestamp() - POPULARITY_EPOCH)
+    )
+    Recipe.objects.update(
+        popularity=(F("favorites_count") + F("shopping_carts_count")) * weight
+    )
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        ("recipes", "0004_feed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="favoriterecipe",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+                verbose_name="Дата добавления",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="popularity",
+            field=models.FloatField(default=0, verbose_name="Популярность"),
+        ),
+        migrations.AddField(
+            model_name="shoppingcart",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+                verbose_name="Дата добавления",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-popularity", "-id"], name="recipe_popularity_idx"
+            ),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 """
 Модели для приложения рецептов: теги, ингредиенты, рецепты,
-избранное и корзина.
+избранное, корзина и лента подписок.
 """
 
 from django.core.validators import MinValueValidator, RegexValidator
@@ -36,6 +36,11 @@ class Tag(models.Model):
         verbose_name='Уникальный слаг',
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
     class Meta:
         """Мета."""
 
@@ -60,6 +65,11 @@ class Ingredient(models.Model):
         verbose_name='Единицы измерения',
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
     class Meta:
         """Мета."""
 
@@ -90,6 +100,7 @@ class Recipe(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
+        db_index=False,
         verbose_name='Пользователь (В рецепте - автор рецепта)',
     )
     ingredients = models.ManyToManyField(
@@ -98,14 +109,6 @@ class Recipe(models.Model):
         related_name='recipes',
         verbose_name='Список ингредиентов',
     )
-    is_favorited = models.BooleanField(
-        default=True,
-        verbose_name='Находится ли в избранном',
-    )
-    is_in_shopping_cart = models.BooleanField(
-        default=True,
-        verbose_name='Находится ли в корзине',
-    )
     name = models.CharField(
         max_length=RECIPE_MAX_LENGTH,
         verbose_name='Название',
@@ -128,6 +131,23 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления (в минутах)',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в избранное',
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в корзину',
+    )
+    popularity = models.FloatField(
+        default=0,
+        verbose_name='Популярность',
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
 
     class Meta:
         """Мета."""
@@ -135,6 +155,16 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-id'],
+                name='recipe_popularity_idx',
+            ),
+            models.Index(
+                fields=['author', 'id'],
+                name='recipe_author_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -229,8 +259,14 @@ class FavoriteRecipe(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='favoriterecipes',
+        db_index=False,
         verbose_name='Пользователь',
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         """Мета."""
@@ -243,6 +279,12 @@ class FavoriteRecipe(models.Model):
                 name='unique_favorite',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='favorite_user_recipe_idx',
+            )
+        ]
         ordering = ['id']
 
     def __str__(self):
@@ -265,8 +307,14 @@ class ShoppingCart(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='shoppingcarts',
+        db_index=False,
         verbose_name='Пользователь',
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         """Мета."""
@@ -279,7 +327,63 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='cart_user_recipe_idx',
+            )
+        ]
         ordering = ['id']
 
     def __str__(self):
         return f'{self.recipe} - {self.user}'
+
+
+class FeedItem(models.Model):
+    """
+    Запись ленты подписок пользователя.
+
+    Заполняется при публикации рецепта для всех подписчиков автора,
+    поэтому страница ленты читается одним диапазоном по индексу
+    уникального ограничения (user, recipe).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        """Мета."""
+
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
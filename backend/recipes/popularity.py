@@ -0,0 +1,103 @@
+"""
+Популярность рецептов с экспоненциальным затуханием во времени.
+
+Событие (добавление в избранное или корзину) в момент t даёт вклад
+exp(λ(t - T0)) с фиксированной точкой отсчёта T0. Затухший к моменту
+now рейтинг отличается от суммы вкладов общим для всех рецептов
+множителем exp(-λ(now - T0)), поэтому сортировка по сохранённой сумме
+совпадает с сортировкой по текущему рейтингу, а новое событие - это
+прибавление к полю через F() без пересчёта остальных рецептов.
+"""
+
+import math
+from collections import defaultdict
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+
+from foodgram.constants import (FEED_BATCH_SIZE, POPULARITY_EPOCH,
+                                POPULARITY_HALF_LIFE, STREAM_CHUNK_SIZE)
+
+from .counters import COUNTERS
+from .models import FavoriteRecipe, Recipe, ShoppingCart
+
+DECAY_RATE = math.log(2) / POPULARITY_HALF_LIFE
+EVENT_MODELS = (FavoriteRecipe, ShoppingCart)
+
+
+def weight(moment):
+    """Вклад события, произошедшего в момент moment."""
+
+    return math.exp(DECAY_RATE * (moment.timestamp() - POPULARITY_EPOCH))
+
+
+def change_popularity(recipe_id, delta):
+    """Атомарное изменение популярности рецепта через F()."""
+
+    Recipe.objects.filter(pk=recipe_id).update(
+        popularity=Greatest(F('popularity') + delta, 0.0)
+    )
+
+
+def change_events(event_model, weights, sign):
+    """
+    Учёт добавленных (sign=1) или удалённых (sign=-1) событий.
+
+    weights - вклады событий по id рецепта. Счётчик событий и
+    популярность всех рецептов меняются одним UPDATE без чтения
+    остальных событий этих рецептов.
+    """
+
+    if not weights:
+        return
+    counter, = (
+        counter
+        for model, counter, counted_model, _ in COUNTERS
+        if model is Recipe and counted_model is event_model
+    )
+    if len(set(weights.values())) == 1:
+        delta = Value(sign * next(iter(weights.values())))
+    else:
+        delta = Case(
+            *(
+                When(pk=recipe_id, then=Value(sign * event_weight))
+                for recipe_id, event_weight in weights.items()
+            ),
+            output_field=FloatField(),
+        )
+    Recipe.objects.filter(pk__in=weights).update(
+        **{counter: Greatest(F(counter) + sign, 0)},
+        popularity=Greatest(F('popularity') + delta, 0.0),
+    )
+
+
+def recompute(pks=None):
+    """
+    Пересчёт популярности по событиям для всех рецептов или только pks.
+
+    Возвращает количество рецептов, у которых значение изменилось.
+    """
+
+    scores = defaultdict(float)
+    for model in EVENT_MODELS:
+        events = model.objects.all()
+        if pks is not None:
+            events = events.filter(recipe_id__in=pks)
+        for recipe_id, created_at in events.values_list(
+            'recipe_id', 'created_at'
+        ).iterator(chunk_size=STREAM_CHUNK_SIZE):
+            scores[recipe_id] += weight(created_at)
+    recipes = Recipe.objects.all()
+    if pks is not None:
+        recipes = recipes.filter(pk__in=pks)
+    changed = [
+        Recipe(pk=pk, popularity=scores[pk])
+        for pk, popularity in recipes.values_list(
+            'pk', 'popularity'
+        ).iterator(chunk_size=STREAM_CHUNK_SIZE)
+        if not math.isclose(popularity, scores[pk])
+    ]
+    Recipe.objects.bulk_update(
+        changed, ['popularity'], batch_size=FEED_BATCH_SIZE
+    )
+    return len(changed)
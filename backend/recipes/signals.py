@@ -0,0 +1,82 @@
+"""Поддержка счётчиков, популярности и ленты при изменении данных."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Subscriber, User
+
+from . import feed
+from .counters import change_counter
+from .models import FavoriteRecipe, Recipe, ShoppingCart
+from .popularity import change_popularity, weight
+
+# Считаемая модель: (модель со счётчиком, поле связи, поле счётчика)
+COUNTED = {
+    FavoriteRecipe: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscriber: (User, 'author_id', 'followers_count'),
+}
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscriber)
+def increase_counter(sender, instance, created, **kwargs):
+    """Увеличение счётчика при создании объекта."""
+
+    if created:
+        model, field, counter = COUNTED[sender]
+        change_counter(model, getattr(instance, field), counter, 1)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscriber)
+def decrease_counter(sender, instance, **kwargs):
+    """Уменьшение счётчика при удалении объекта."""
+
+    model, field, counter = COUNTED[sender]
+    change_counter(model, getattr(instance, field), counter, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    """Добавление нового рецепта в ленты подписчиков."""
+
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Subscriber)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Заполнение ленты при подписке."""
+
+    if created:
+        feed.backfill(instance)
+
+
+@receiver(post_delete, sender=Subscriber)
+def clear_feed(sender, instance, **kwargs):
+    """Очистка ленты при отписке."""
+
+    feed.clear(instance)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def increase_popularity(sender, instance, created, **kwargs):
+    """Вклад нового события в популярность рецепта."""
+
+    if created:
+        change_popularity(instance.recipe_id, weight(instance.created_at))
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def decrease_popularity(sender, instance, **kwargs):
+    """Вычитание вклада удалённого события из популярности рецепта."""
+
+    change_popularity(instance.recipe_id, -weight(instance.created_at))
@@ -0,0 +1,101 @@
+"""Тесты ленты подписок."""
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from users.models import Subscriber, User
+
+from . import feed
+from .models import FeedItem, Recipe
+
+
+@mock.patch.object(feed, 'FEED_FANOUT_MAX_FOLLOWERS', 1)
+@mock.patch.object(feed, 'FEED_FANOUT_RESUME_FOLLOWERS', 1)
+class FeedModeTest(TestCase):
+    """Переключение режима раскладки автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, *cls.followers = User.objects.bulk_create(
+            User(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(4)
+        )
+
+    def publish(self):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            text='Описание.',
+            cooking_time=10,
+        )
+
+    def subscribe(self, user):
+        return Subscriber.objects.create(user=user, author=self.author)
+
+    def unsubscribe(self, user):
+        Subscriber.objects.get(user=user, author=self.author).delete()
+
+    def feed(self, user):
+        return feed.feed_recipe_ids(user, 10)
+
+    def test_recipes_published_in_read_mode_stay_in_feeds(self):
+        first, second, third = self.followers
+        self.subscribe(first)
+        self.subscribe(second)
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.feed_fanout)
+        recipe = self.publish()
+        self.subscribe(third)
+        self.assertFalse(FeedItem.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.feed(first), [recipe.pk])
+        self.unsubscribe(second)
+        self.unsubscribe(third)
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.feed_fanout)
+        self.assertEqual(self.feed(first), [recipe.pk])
+        call_command('resume_feed_fanout', stdout=StringIO())
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.feed_fanout)
+        self.assertTrue(
+            FeedItem.objects.filter(user=first, recipe=recipe).exists()
+        )
+        self.assertEqual(self.feed(first), [recipe.pk])
+        self.assertEqual(self.feed(third), [])
+
+    @mock.patch('recipes.feed.FEED_BATCH_SIZE', 1)
+    def test_resume_in_batches(self):
+        for user in self.followers:
+            self.subscribe(user)
+        recipes = [self.publish(), self.publish()]
+        for user in self.followers[1:]:
+            self.unsubscribe(user)
+        self.subscribe(self.followers[1])
+        self.unsubscribe(self.followers[1])
+        self.assertTrue(feed.resume_fanout(self.author.pk))
+        self.assertEqual(
+            set(FeedItem.objects.values_list('user_id', 'recipe_id')),
+            {(self.followers[0].pk, recipe.pk) for recipe in recipes},
+        )
+
+    def test_resume_skips_popular_author(self):
+        for user in self.followers:
+            self.subscribe(user)
+        self.assertFalse(feed.resume_fanout(self.author.pk))
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.feed_fanout)
+
+    def test_fanout_mode(self):
+        first = self.followers[0]
+        recipe = self.publish()
+        self.subscribe(first)
+        newer = self.publish()
+        self.assertEqual(self.feed(first), [newer.pk, recipe.pk])
+        self.assertEqual(FeedItem.objects.filter(user=first).count(), 2)
@@ -9,5 +9,7 @@ from .models import ShortLink
 class ShortLinkAdmin(admin.ModelAdmin):
     """Админка для коротких ссылок."""
 
-    list_display = ('id', 'original_url', 'url_hash')
+    list_display = ('id', 'original_url', 'url_hash', 'recipe', 'clicks')
+    readonly_fields = ('clicks',)
+    raw_id_fields = ('recipe',)
     list_display_links = ('original_url',)
@@ -9,3 +9,6 @@ class UrlshortConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'urlshort'
     verbose_name = 'Короткий URL-адрес'
+
+    def ready(self):
+        from . import signals  # noqa: F401
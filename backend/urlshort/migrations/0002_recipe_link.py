@@ -0,0 +1,57 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+RECIPE_URL = re.compile(r"/recipes/(\d+)/?(?:[?#].*)?$")
+
+
+def link_recipes(apps, schema_editor):
+    """Привязка существующих ссылок к рецептам по адресу страницы."""
+
+    ShortLink = apps.get_model("urlshort", "ShortLink")
+    Recipe = apps.get_model("recipes", "Recipe")
+    recipe_ids = set(Recipe.objects.values_list("id", flat=True))
+    linked = set()
+    for link in ShortLink.objects.order_by("id").iterator():
+        match = RECIPE_URL.search(link.original_url)
+        if match is None:
+            continue
+        recipe_id = int(match.group(1))
+        if recipe_id in recipe_ids and recipe_id not in linked:
+            linked.add(recipe_id)
+            link.recipe_id = recipe_id
+            link.save(update_fields=["recipe"])
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        ("recipes", "0005_popularity"),
+        ("urlshort", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shortlink",
+            name="recipe",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="short_link",
+                to="recipes.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shortlink",
+            name="original_url",
+            field=models.CharField(
+                db_index=True, max_length=256, verbose_name="Оригинальная ссылка"
+            ),
+        ),
+        migrations.RunPython(link_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        ("urlshort", "0002_recipe_link"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shortlink",
+            name="clicks",
+            field=models.PositiveBigIntegerField(default=0, verbose_name="Переходы"),
+        ),
+    ]
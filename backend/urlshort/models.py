@@ -2,11 +2,17 @@
 
 import string
 from random import choice, randint
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from django.db import models
 
+from recipes.models import Recipe
+
 from foodgram.constants import (HASH_FIELD_LENGTH, MAX_HASH_LENGTH,
-                                MAX_URL_LENGTH, MIN_HASH_LENGTH)
+                                MAX_URL_LENGTH, MIN_HASH_LENGTH,
+                                RECIPE_HASH_MULTIPLIER, RECIPE_HASH_OFFSET)
+
+HASH_ALPHABET = string.digits + string.ascii_letters
 
 
 def generate_hash():
@@ -18,13 +24,60 @@ def generate_hash():
     )
 
 
+def recipe_hash(recipe_id):
+    """
+    Код рецепта в base62 фиксированной длины.
+
+    id переставляется аффинным отображением по модулю 62^MIN_HASH_LENGTH,
+    которое взаимно однозначно, поэтому коды разных рецептов не совпадают,
+    а соседние id дают непохожие коды.
+    """
+
+    value = (
+        recipe_id * RECIPE_HASH_MULTIPLIER + RECIPE_HASH_OFFSET
+    ) % len(HASH_ALPHABET) ** MIN_HASH_LENGTH
+    digits = []
+    for _ in range(MIN_HASH_LENGTH):
+        value, digit = divmod(value, len(HASH_ALPHABET))
+        digits.append(HASH_ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def normalize_url(url):
+    """Приведение ссылки к каноническому виду для поиска повторов."""
+
+    parts = urlsplit(url.strip())
+    return urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path or '/',
+            urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True))),
+            '',
+        )
+    )
+
+
 class ShortLink(models.Model):
     """Модель коротких ссылок"""
 
     original_url = models.CharField(
         max_length=MAX_URL_LENGTH,
+        db_index=True,
         verbose_name='Оригинальная ссылка',
     )
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='short_link',
+        verbose_name='Рецепт',
+    )
+    clicks = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Переходы',
+    )
     url_hash = models.CharField(
         unique=True,
         max_length=HASH_FIELD_LENGTH,
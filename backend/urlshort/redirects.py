@@ -0,0 +1,151 @@
+"""
+Кэш переходов по коротким ссылкам и счётчик переходов.
+
+Код ссылки сопоставляется с адресом через LRU-кэш процесса, при
+SHORT_LINK_SHARED_CACHE - ещё и через общий кэш Django. Неизвестные коды
+тоже кэшируются, на меньший срок. Переходы копятся в памяти и
+записываются в БД пачкой по таймеру и при завершении процесса.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter, OrderedDict
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, Value, When
+
+from foodgram.constants import (SHORT_LINK_CACHE_TTL,
+                                SHORT_LINK_FLUSH_INTERVAL, SHORT_LINK_LRU_SIZE,
+                                SHORT_LINK_MISSING_TTL)
+
+from .models import ShortLink
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = (None, None)
+
+
+def shared_key(url_hash):
+    """Ключ общего кэша для кода ссылки."""
+
+    return f'short_link:{url_hash}'
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш со сроком жизни записей."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class ClickCounter:
+    """Счётчик переходов с пакетной записью в БД."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, link_id):
+        with self._lock:
+            self._counts[link_id] += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Запись накопленных переходов одним UPDATE."""
+
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._timer = None
+        if not counts:
+            return
+        try:
+            ShortLink.objects.filter(pk__in=counts).update(
+                clicks=F('clicks') + Case(
+                    *(
+                        When(pk=link_id, then=Value(count))
+                        for link_id, count in counts.items()
+                    ),
+                    default=Value(0),
+                )
+            )
+        except DatabaseError:
+            logger.exception('Не удалось записать переходы по ссылкам.')
+            with self._lock:
+                self._counts.update(counts)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+
+links = LRUCache(SHORT_LINK_LRU_SIZE)
+clicks = ClickCounter(SHORT_LINK_FLUSH_INTERVAL)
+atexit.register(clicks.flush)
+
+
+def ttl(link):
+    """Срок жизни записи кэша: у неизвестных кодов он короче."""
+
+    if link == NOT_FOUND:
+        return SHORT_LINK_MISSING_TTL
+    return SHORT_LINK_CACHE_TTL
+
+
+def resolve(url_hash):
+    """Пара (id ссылки, адрес) по коду или NOT_FOUND."""
+
+    link = links.get(url_hash)
+    if link is not None:
+        return link
+    if settings.SHORT_LINK_SHARED_CACHE:
+        link = cache.get(shared_key(url_hash))
+    if link is None:
+        link = ShortLink.objects.filter(url_hash=url_hash).values_list(
+            'id', 'original_url'
+        ).first()
+        link = NOT_FOUND if link is None else tuple(link)
+        if settings.SHORT_LINK_SHARED_CACHE:
+            cache.set(shared_key(url_hash), link, ttl(link))
+    links.set(url_hash, link, ttl(link))
+    return link
+
+
+def invalidate(url_hash):
+    """Удаление кода из кэшей."""
+
+    links.delete(url_hash)
+    if settings.SHORT_LINK_SHARED_CACHE:
+        cache.delete(shared_key(url_hash))
@@ -0,0 +1,16 @@
+"""Сброс кэша переходов при изменении коротких ссылок."""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import redirects
+from .models import ShortLink
+
+
+@receiver(post_save, sender=ShortLink)
+@receiver(post_delete, sender=ShortLink)
+def reset_redirect_cache(sender, instance, **kwargs):
+    """Сброс кэша кода ссылки, в том числе отрицательного."""
+
+    transaction.on_commit(lambda: redirects.invalidate(instance.url_hash))
@@ -32,6 +32,7 @@ class UserAdmin(BaseUserAdmin):
         'username',
         'first_name',
         'last_name',
+        'recipes_count',
         'get_subscribers',
     )
     list_display_links = ('username',)
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+
+
+def fill_followers_count(apps, schema_editor):
+    """Заполнение счётчика подписчиков по существующим подпискам."""
+
+    User = apps.get_model("users", "User")
+    Subscriber = apps.get_model("users", "Subscriber")
+    User.objects.update(
+        followers_count=Coalesce(
+            Subquery(
+                Subscriber.objects.filter(author=OuterRef("pk"))
+                .order_by()
+                .values("author")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+def fill_feed_fanout(apps, schema_editor):
+    """Режим чтения ленты для авторов с большим числом подписчиков."""
+
+    User = apps.get_model("users", "User")
+    User.objects.filter(followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS).update(
+        feed_fanout=False
+    )
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        ("users", "0002_recipes_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Количество подписчиков"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="feed_fanout",
+            field=models.BooleanField(
+                default=True, verbose_name="Рецепты раскладываются по лентам"
+            ),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+        migrations.RunPython(fill_feed_fanout, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-17 04:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Миграция для изменения структуры базы данных."""
+
+    dependencies = [
+        ("users", "0003_followers_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subscriber",
+            index=models.Index(
+                fields=["user", "author"], name="subscriber_user_author_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subscriber",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="subscriber",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Подписчик",
+            ),
+        ),
+    ]
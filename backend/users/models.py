@@ -35,6 +35,18 @@ class User(AbstractUser):
         verbose_name='Ссылка на аватар',
         upload_to='avatars/',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    feed_fanout = models.BooleanField(
+        default=True,
+        verbose_name='Рецепты раскладываются по лентам',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -63,6 +75,7 @@ class Subscriber(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='subscriber',
+        db_index=False,
         verbose_name='Подписчик',
     )
 
@@ -80,6 +93,12 @@ class Subscriber(models.Model):
                 name='author_and_user_personal',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='subscriber_user_author_idx',
+            )
+        ]
 
     def __str__(self):
         return f'{self.author} - {self.user}'